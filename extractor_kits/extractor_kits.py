@@ -1,48 +1,133 @@
 import re
-import csv
 import json
 import pandas as pd
 import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime
+from itertools import repeat
 #from typing import List, Dict, Optional, Tuple
 
 
+# Expresión compilada una sola vez para normalizar espacios múltiples
+_ESPACIOS = re.compile(r'\s+')
+
+# Escribe los productos extraídos en debug_kits.txt al terminar el procesamiento
+DEBUG_KITS = False
+
+# Sustituciones de un solo carácter aplicadas en una pasada con str.translate
+_TRADUCCION_KITS = str.maketrans({'|': ':', '_': ':', '=': ':', '(': ' ', ')': ' ', '/': ' '})
+
+# Columnas del archivo de salida de kits
+CAMPOS_SALIDA_KITS = [
+    'numero_aceptacion', 'producto', 'marca', 'referencia', 'modelo', 
+    'cantidad', 'unidad', 'es_cadena', 'pasos_medidas', 'cantidad_original', 
+    'fecha_procesamiento'
+]
+
+# Configuración de cada proceso trabajador, fijada una vez por _iniciar_trabajador_kits
+_CONFIG_TRABAJADOR = {}
+
+# Columnas que identifican un registro repetido en la salida
+CLAVE_UNICA_KITS = ['numero_aceptacion', 'producto', 'marca', 'referencia', 'modelo', 'cantidad']
+
+# Filas por bloque al repartir el archivo de kits entre procesos
+TAMANO_BLOQUE_KITS = 10000
+
+# Orden en que se aplican las expresiones regulares de normalización
+ORDEN_EXPRESIONES_KITS = [
+    # "eliminar_decimales",
+    "normalizar_cantidad_unidad_decimales",
+    "normalizar_cantidad_unidad_enteros",
+    "separar_cantidad_producto",
+    "normalizar_espacios_antes_producto",
+    "normalizar_cantidad_punto_coma",
+    "normalizar_cantidad_coma",
+    "normalizar_punto_coma_mercancia",
+    "limpiar_espacios_multiples",
+    "patron_palabra_cantidad",
+    "normalizar_cantidad_espacio"
+]
+
+# Expresiones de normalización ya compiladas, por (patron, reemplazo) en orden de aplicación
+_CACHE_EXPRESIONES = {}
+
+# Archivos JSON ya cargados, por ruta absoluta y fecha de modificación
+_CACHE_JSON = {}
+
+# Patrones de extracción compilados una sola vez al cargar el módulo
+_PATRONES_PRODUCTO = [re.compile(patron, re.IGNORECASE) for patron in [
+    r'(?P<coma>,\s*)?PRODUCTO:\s*(?P<valor>[^,]+?)(?=\s*,\s*(?:MARCA|CANTIDAD|REFERENCIA|MODELO|CADENA|KIT|$))',
+    r',\s*PRODUCTO:\s*([^,\.;:]+?)(?=\s*[,\.;:]|$)'
+]]
+
+_PATRONES_MARCA = [re.compile(patron, re.IGNORECASE) for patron in [
+    r'(?P<coma>,\s*)?MARCA:\s*(?P<valor>[^,]+?)(?=\s*,\s*(?:MODELO|REFERENCIA|CANTIDAD|PRODUCTO|CADENA|KIT|$))',
+    r',\s*MARCA:\s*([^,\.;:]+?)(?=\s*[,\.;:]|$)'
+]]
+
+_PATRONES_REFERENCIA = [re.compile(patron, re.IGNORECASE) for patron in [
+    r'(?P<coma>,\s*)?REFERENCIA:\s*(?P<valor>[^,]+?)(?=\s*,\s*(?:MARCA|CANTIDAD|PRODUCTO|MODELO|CADENA|KIT|$))',
+    r',\s*REFERENCIA:\s*([^,\.;:]+?)(?=\s*[,\.;:]|$)'
+]]
+
+_PATRONES_MODELO = [re.compile(patron, re.IGNORECASE) for patron in [
+    r'(?P<coma>,\s*)?MODELO:\s*(?P<valor>[^,]+?)(?=\s*,\s*(?:MARCA|CANTIDAD|PRODUCTO|REFERENCIA|CADENA|KIT|$))',
+    r',\s*MODELO:\s*([^,\.;:]+?)(?=\s*[,\.;:]|$)'
+]]
+
+_PATRONES_CANTIDAD = [re.compile(patron, re.IGNORECASE) for patron in [
+    r'(\d+(?:\.\d+)?)\s*(?:UNIDADES?|PIEZA|KILOS|UND)',
+    r',\s*CANTIDAD:\s*\(?(\d+)\)?\s*U(?!NIDAD)',
+    r',\s*CANTIDAD:\s*(\d+)',
+    r'CANTIDAD:\s*(\d+(?:\.\d+)?)\s*(?:UNIDADES?|UND)',
+    r'CANT\s*\(\s*(\d+(?:\.\d+)?)\s*U\s*\)'
+]]
+
+_PATRON_CADENA = re.compile('|'.join([
+    r'CADENA',
+    r'CHAIN',
+    r'CADENILLA',
+    r'KIT\s+ARRASTRE',
+    r'KIT\s+DE\s+ARRASTRE'
+]), re.IGNORECASE)
+
+_PATRONES_PASO = [re.compile(patron, re.IGNORECASE) for patron in [
+    r'(\d+H[-\s]*\d*L?)',
+    r'(\d+\s*H)',
+    r'(\d+\.\d+\s*MM)',
+    r'(\d+MM)',
+    r'PASO:\s*([^,]+?)(?=\s*,|$)',
+    r'MEDIDA:\s*([^,]+?)(?=\s*,|$)'
+]]
+
+# Decimales en cero de la cantidad original (12.00, 12,00)
+_DECIMALES_CERO = re.compile(r'(\d+)[.,\s]00\b')
+
+# Signos de puntuación y espacios sobrantes al final de una coincidencia
+_RECORTE_FINAL = re.compile(r'[,;\.:\s]+$')
+
+
+def _leer_excel_raw(file_path, columnas_usadas):
+    """
+    Lee la hoja DatosParte1 de un archivo Excel crudo, o devuelve None si no se puede leer.
+    """
+    try:
+        # Solo se leen las columnas que se usan; calamine evita construir el libro completo en memoria
+        return pd.read_excel(file_path, sheet_name='DatosParte1', engine='calamine',
+                             usecols=lambda col: col in columnas_usadas)
+    except Exception as e:
+        print(f"Error reading {os.path.basename(file_path)}: {e}")
+        return None
+
+
 def procesar_archivos_raw(directorio_salida, archivo_entrada):
     """
     Procesa archivos Excel de datos crudos y genera un archivo CSV unificado.
     """
     excel_dir = 'dataraw'
     #excel_dir = os.path.join(excel_dir, excel_dir)
-    excel_files = [f for f in os.listdir(excel_dir) if f.endswith('.xlsx') and not f.startswith('~$')]
-
-    dfs = {}
-    for file in excel_files:
-        file_path = os.path.join(excel_dir, file)
-        try:
-            df_excel = pd.read_excel(file_path, sheet_name='DatosParte1')
-            dfs[file] = df_excel
-        except Exception as e:
-            print(f"Error reading {file}: {e}")
-    
-    print("Procesando Dataframes")
-    if not dfs:
-        print("Archivos de Excel No validos")
-        print("No se encontraron archivos de Excel válidos en el directorio.")
-        exit(1)
-    
-    for file, df in dfs.items():
-        print(f"\nCreando dataframe {file}:")
-        print(f"Lineas procesadas: {len(df)}")  
-
-    if dfs:
-        unified_df = pd.concat(dfs.values(), ignore_index=True)
-        print("\nCreando Dataframe Unificado:")
-        print(f"Total de lineas procesadas: {len(unified_df)}")
-    else:
-        unified_df = pd.DataFrame()
-
-    print("\nRemoviendo | de los datos originales")
-    unified_df = unified_df.replace('|', '', regex=True)
+    excel_files = [entrada.name for entrada in os.scandir(excel_dir)
+                   if entrada.name.endswith('.xlsx') and not entrada.name.startswith('~$')]
 
     detalle_cols = [
         'Descripción de la Mercancía Detallada 1',
@@ -51,19 +136,44 @@ def procesar_archivos_raw(directorio_salida, archivo_entrada):
         'Descripción de la Mercancía Detallada 4',
         'Descripción de la Mercancía Detallada 5'
     ]
+    columnas_usadas = set(detalle_cols + ['Número de Aceptación', 'Cantidad', 'Unidad Comercial'])
+
+    # Los archivos se leen en paralelo; map conserva el orden de excel_files
+    with ThreadPoolExecutor(max_workers=max(1, min(os.cpu_count() or 1, len(excel_files)))) as executor:
+        leidos = list(executor.map(_leer_excel_raw, [os.path.join(excel_dir, file) for file in excel_files],
+                                   repeat(columnas_usadas)))
+
+    print("Procesando Dataframes")
+    frames = []
+    for file, df_excel in zip(excel_files, leidos):
+        if df_excel is not None:
+            print(f"\nCreando dataframe {file}:")
+            print(f"Lineas procesadas: {len(df_excel)}")
+            frames.append(df_excel)
+
+    if not frames:
+        print("Archivos de Excel No validos")
+        print("No se encontraron archivos de Excel válidos en el directorio.")
+        exit(1)
+
+    unified_df = pd.concat(frames, ignore_index=True, sort=False)
+    # Liberar las referencias a los DataFrames por archivo una vez unificados
+    del frames, leidos
+    print("\nCreando Dataframe Unificado:")
+    print(f"Total de lineas procesadas: {len(unified_df)}")
 
     detalle_cols = [col for col in detalle_cols if col in unified_df.columns]
 
     print("\nNormalizando Descripciones de Mercancía")
-    unified_df['descripcion'] = unified_df[detalle_cols].fillna('').agg(' '.join, axis=1).str.strip()
+    # Concatenación por columnas en una sola llamada; las celdas numéricas se pasan a texto
+    detalle = unified_df[detalle_cols].fillna('').astype(str)
+    unified_df['descripcion'] = detalle.iloc[:, 0].str.cat(detalle.iloc[:, 1:], sep=' ').str.strip()
 
-    final_df = unified_df[['Número de Aceptación', 'descripcion', 'Cantidad', 'Unidad Comercial']].copy()
-
-    final_df = final_df.rename(columns={
+    # Con Copy-on-Write la selección y el renombrado no copian los datos
+    final_df = unified_df[['Número de Aceptación', 'descripcion', 'Cantidad', 'Unidad Comercial']].rename(columns={
         'Número de Aceptación': 'numeroaceptacion',
         'Cantidad': 'cantidad',
-        'Unidad Comercial': 'unidades',
-        'Descripción de la Mercancía Detallada': 'descripcion'
+        'Unidad Comercial': 'unidades'
     })
 
     print("\nIniciando creacion de Dataframe final")
@@ -75,6 +185,19 @@ def procesar_archivos_raw(directorio_salida, archivo_entrada):
     final_df.to_csv(output_file, index=False, sep="|")
     print(f"\nDataframe generado en archivo: {output_file}")
 
+    return final_df
+
+
+def _cargar_json(ruta):
+    """
+    Carga un archivo JSON reutilizando el contenido leído mientras el archivo no cambie.
+    """
+    clave = (os.path.abspath(ruta), os.path.getmtime(ruta))
+    if clave not in _CACHE_JSON:
+        with open(ruta, 'r', encoding='utf-8') as archivo:
+            _CACHE_JSON[clave] = json.load(archivo)
+    return _CACHE_JSON[clave]
+
 
 def cargar_diccionario_kits(archivo_diccionario):
     """
@@ -83,9 +206,8 @@ def cargar_diccionario_kits(archivo_diccionario):
     print(f"Entrando a cargar_diccionario_kits")
 
     try:
-        with open(archivo_diccionario, 'r', encoding='utf-8') as archivo:
-            diccionario = json.load(archivo)
-            return diccionario
+        diccionario = _cargar_json(archivo_diccionario)
+        return diccionario
     except FileNotFoundError:
         print(f"Error: No se pudo encontrar el archivo de diccionario {archivo_diccionario}")
         return None
@@ -104,9 +226,8 @@ def cargar_expresiones_regulares_kits(archivo_expresiones):
     print(f"Entrando a cargar_expresiones_regulares_kits")
 
     try:
-        with open(archivo_expresiones, 'r', encoding='utf-8') as archivo:
-            expresiones = json.load(archivo)
-            return expresiones.get("expresiones_regulares", {})
+        expresiones = _cargar_json(archivo_expresiones)
+        return expresiones.get("expresiones_regulares", {})
     except FileNotFoundError:
         print(f"Error: No se pudo encontrar el archivo de expresiones regulares {archivo_expresiones}")
         return {}
@@ -117,67 +238,129 @@ def cargar_expresiones_regulares_kits(archivo_expresiones):
         print(f"Error al cargar las expresiones regulares: {e}")
         return {}
 
-def aplicar_expresiones_regulares_ordenadas(texto, expresiones_regulares):
-    """
-    Aplica todas las expresiones regulares de normalización al texto en orden específico.
-    """
-    orden_aplicacion = [
-        # "eliminar_decimales",
-        "normalizar_cantidad_unidad_decimales",
-        "normalizar_cantidad_unidad_enteros", 
-        "separar_cantidad_producto",
-        "normalizar_espacios_antes_producto",
-        "normalizar_cantidad_punto_coma",
-        "normalizar_cantidad_coma",
-        "normalizar_punto_coma_mercancia",
-        "limpiar_espacios_multiples",
-        "patron_palabra_cantidad",
-        "normalizar_cantidad_espacio"
-    ]
-    
-    for nombre_expr in orden_aplicacion:
+def compilar_expresiones_ordenadas(expresiones_regulares):
+    """
+    Compila las expresiones regulares de normalización en el orden de aplicación.
+    El resultado se guarda en caché para no volver a compilar los mismos patrones.
+    """
+    configuraciones = []
+    for nombre_expr in ORDEN_EXPRESIONES_KITS:
         if nombre_expr in expresiones_regulares:
             config = expresiones_regulares[nombre_expr]
             patron = config.get("patron", "")
             reemplazo = config.get("reemplazo", "")
             if patron:
-                try:
-                    texto = re.sub(patron, reemplazo, texto)
-                except re.error:
-                    continue
+                configuraciones.append((patron, reemplazo))
+
+    clave = tuple(configuraciones)
+    if clave not in _CACHE_EXPRESIONES:
+        compiladas = []
+        for patron, reemplazo in configuraciones:
+            try:
+                compiladas.append((re.compile(patron), reemplazo))
+            except re.error:
+                continue
+        _CACHE_EXPRESIONES[clave] = compiladas
+
+    return _CACHE_EXPRESIONES[clave]
+
+def aplicar_expresiones_regulares_ordenadas(textos, expresiones_compiladas):
+    """
+    Aplica todas las expresiones regulares de normalización, ya compiladas en orden de
+    aplicación, a la columna de textos.
+    """
+    for patron, reemplazo in expresiones_compiladas:
+        try:
+            textos = textos.str.replace(patron, reemplazo, regex=True)
+        except re.error:
+            continue
     
-    return texto.strip()
+    return textos.str.strip()
 
-def limpiar_y_normalizar_texto_kits(texto, expresiones_regulares):
+def limpiar_y_normalizar_texto_kits(textos, expresiones_compiladas):
     """
-    Aplica transformaciones de limpieza y normalización específicas para kits y cadenas.
+    Aplica transformaciones de limpieza y normalización específicas para kits y cadenas
+    sobre la columna completa de descripciones.
     """
     print(f"Entrando a limpiar_y_normalizar_texto_kits")
 
-    # Convertir a mayúsculas y normalizar espacios
-    texto = texto.upper()
-    texto = re.sub(r'\s+', ' ', texto).strip()
+    # Convertir a mayúsculas con str.upper de Python: el kernel de Arrow no expande
+    # caracteres como "ß" -> "SS" igual que la conversión por línea
+    textos = textos.map(str.upper)
+    textos = textos.str.replace(_ESPACIOS, ' ', regex=True).str.strip()
     
     # Reemplazos específicos para kits y cadenas
-    texto = texto.replace("|", ":")
-    texto = texto.replace("_", ":")
-    texto = texto.replace("=", ":")
-    texto = texto.replace("(", " ")
-    texto = texto.replace(")", " ")
-    texto = texto.replace("/", " ")
+    textos = textos.str.translate(_TRADUCCION_KITS)
 
     # Aplicar expresiones regulares de normalización
-    texto = aplicar_expresiones_regulares_ordenadas(texto, expresiones_regulares)
+    textos = aplicar_expresiones_regulares_ordenadas(textos, expresiones_compiladas)
 
     # Normalizar espacios múltiples
-    texto = re.sub(r'\s+', ' ', texto).strip()
+    textos = textos.str.replace(_ESPACIOS, ' ', regex=True).str.strip()
+
+    return textos
+
+
+def _se_solapan(a, b):
+    """
+    Indica si dos cadenas pueden compartir caracteres cuando aparecen en un mismo texto.
+    """
+    if a in b or b in a:
+        return True
+    return any(a.endswith(b[:k]) or b.endswith(a[:k]) for k in range(1, min(len(a), len(b))))
+
 
-    return texto
+def _agrupar_variantes(variantes, reemplazo):
+    """
+    Divide las variantes en grupos que se pueden reemplazar en una sola pasada con el mismo
+    resultado que los reemplazos secuenciales: dentro de un grupo ninguna variante se solapa
+    con otra ni con el texto de reemplazo. Las variantes que sí se solapan quedan solas.
+    """
+    grupos = []
+    for variante in variantes:
+        encadenada = _se_solapan(variante, reemplazo)
+        if (grupos and not encadenada and not _se_solapan(grupos[-1][0], reemplazo)
+                and not any(_se_solapan(variante, otra) for otra in grupos[-1])):
+            grupos[-1].append(variante)
+        else:
+            grupos.append([variante])
+    return grupos
+
+
+def _reemplazar_variantes(textos, corpus, variantes, reemplazo):
+    """
+    Reemplaza todas las variantes de una categoría con una pasada por grupo de variantes.
+    Los grupos cuyas variantes no aparecen en el corpus (los textos unidos) se omiten.
+    Devuelve los textos y el corpus actualizados.
+    """
+    for grupo in _agrupar_variantes(variantes, reemplazo):
+        grupo = [variante for variante in grupo if variante in corpus]
+        if not grupo:
+            continue
+        if len(grupo) == 1:
+            textos = textos.str.replace(grupo[0], reemplazo, regex=False)
+        else:
+            patron = re.compile('|'.join(re.escape(variante) for variante in grupo))
+            textos = textos.str.replace(patron, reemplazo.replace('\\', r'\\'), regex=True)
+        corpus = '\n'.join(textos)
+    return textos, corpus
+
+
+def _reemplazar_mapa(textos, corpus, mapa):
+    """
+    Aplica en orden los reemplazos de un diccionario variante -> reemplazo, omitiendo las
+    variantes que no aparecen en el corpus. Devuelve los textos y el corpus actualizados.
+    """
+    for variant, reemplazo in mapa.items():
+        if reemplazo and variant in corpus:
+            textos = textos.str.replace(variant, reemplazo, regex=False)
+            corpus = '\n'.join(textos)
+    return textos, corpus
 
 
-def aplicar_reemplazos_diccionario_kits(texto, diccionario):
+def aplicar_reemplazos_diccionario_kits(textos, diccionario):
     """
-    Aplica reemplazos específicos para kits usando el diccionario.
+    Aplica reemplazos específicos para kits usando el diccionario sobre la columna de textos.
     """
     # Extraer variantes del diccionario para kits
     segun_variants = diccionario.get("segun_variants", [])
@@ -194,333 +377,315 @@ def aplicar_reemplazos_diccionario_kits(texto, diccionario):
     referencia_modelo_variants = diccionario.get("referencia_modelo_variants", {})
     referencia_segun_variant = diccionario.get("referencia_segun_variant", {})
     unidades_variants = diccionario.get("unidades_medida", [])
+
+    # Textos de la columna unidos, para saber qué variantes aparecen sin recorrer cada texto
+    corpus = '\n'.join(textos)
     
     #Aplicar reemplazos de "SEGUN"
-    for variant in segun_variants:
-        if variant in texto:
-                texto = texto.replace(variant, "SEGUN")
+    textos, corpus = _reemplazar_variantes(textos, corpus, segun_variants, "SEGUN")
 
     # Aplicar reemplazos de productos
-    for variant in producto_variants:
-        if variant in texto:
-            texto = texto.replace(variant, ", PRODUCTO:")
+    textos, corpus = _reemplazar_variantes(textos, corpus, producto_variants, ", PRODUCTO:")
     
      
     # Aplicar reemplazos de marcas
-    for variant in marca_variants:
-        if variant in texto:
-            texto = texto.replace(variant, ", MARCA:")
+    textos, corpus = _reemplazar_variantes(textos, corpus, marca_variants, ", MARCA:")
     
     # Aplicar reemplazos de referencias
-    for variant in referencia_variants:
-        if variant in texto:
-            texto = texto.replace(variant, ", REFERENCIA:")
+    textos, corpus = _reemplazar_variantes(textos, corpus, referencia_variants, ", REFERENCIA:")
     
     # Aplicar reemplazos de modelos
-    for variant in modelo_variants:
-        if variant in texto:
-            texto = texto.replace(variant, ", MODELO:")
+    textos, corpus = _reemplazar_variantes(textos, corpus, modelo_variants, ", MODELO:")
     
     # Aplicar reemplazos de cantidades
-    for variant in cantidad_variants:
-        if variant in texto:
-            texto = texto.replace(variant, ", CANTIDAD:")
+    textos, corpus = _reemplazar_variantes(textos, corpus, cantidad_variants, ", CANTIDAD:")
     
     # Aplicar reemplazos de cadenas
-    for variant in cadena_variants:
-        if variant in texto:
-            texto = texto.replace(variant, ", CADENA:")
+    textos, corpus = _reemplazar_variantes(textos, corpus, cadena_variants, ", CADENA:")
     
     # Aplicar reemplazos de kits
-    for variant in kit_variants:
-        if variant in texto:
-            texto = texto.replace(variant, ", KIT:")
+    textos, corpus = _reemplazar_variantes(textos, corpus, kit_variants, ", KIT:")
     
     # Aplicar reemplazos de pasos
-    for variant in paso_variants:
-        if variant in texto:
-            texto = texto.replace(variant, ", PASO:")
+    textos, corpus = _reemplazar_variantes(textos, corpus, paso_variants, ", PASO:")
 
     # # Aplicar reemplazos de unidades
-    # for variant in unidades_variants:
-    #     if variant in texto:
-    #         texto = texto.replace(variant, " UNIDADES, ")
+    # textos, corpus = _reemplazar_variantes(textos, corpus, unidades_variants, " UNIDADES, ")
    
     
      #Reemplazar diccionario de marcas conocidas
-    for variant in marcas_conocidas:
-        if variant in texto:
-            # reemplazar variante por el valor de reemplazo del diccionario
-            reemplazo = diccionario.get("marcas_conocidas", {}).get(variant, "")
-            if reemplazo:
-                texto = texto.replace(variant, reemplazo)  
+    textos, corpus = _reemplazar_mapa(textos, corpus, marcas_conocidas)
     
     # Reemplazar partes variantes
-    for variant in partes_variants:
-        if variant in texto:
-            # reemplazar variante por el valor de reemplazo del diccionario
-            reemplazo = diccionario.get("partes_variants", {}).get(variant, "")
-            if reemplazo:
-                texto = texto.replace(variant, reemplazo)
+    textos, corpus = _reemplazar_mapa(textos, corpus, partes_variants)
 
     # Reemplazar referencias y modelos variantes
-    for variant in referencia_modelo_variants:
-        if variant in texto:
-            # reemplazar variante por el valor de reemplazo del diccionario
-            reemplazo = diccionario.get("referencia_modelo_variants", {}).get(variant, "")
-            if reemplazo:
-                texto = texto.replace(variant, reemplazo)
+    textos, corpus = _reemplazar_mapa(textos, corpus, referencia_modelo_variants)
     
     # Reemplazar referencias según variante
-    for variant in referencia_segun_variant:
-        if variant in texto:
-            # reemplazar variante por el valor de reemplazo del diccionario
-            reemplazo = diccionario.get("referencia_segun_variant", {}).get(variant, "")
-            if reemplazo:
-                texto = texto.replace(variant, reemplazo)
+    textos, corpus = _reemplazar_mapa(textos, corpus, referencia_segun_variant)
 
-    return texto
+    return textos
 
 
-def extraer_productos(texto_procesado):
+def _coincidencias_por_fila(textos, patrones):
     """
-    Extrae productos del texto procesado.
+    Ejecuta cada patrón sobre la columna completa y devuelve las coincidencias
+    indexadas por la fila de origen, en el orden de los patrones.
     """
-    productos = set()
-    
-    patrones_producto = [
-        r',\s*PRODUCTO:\s*([^,]+?)(?=\s*,\s*(?:MARCA|CANTIDAD|REFERENCIA|MODELO|CADENA|KIT|$))',
-        r'PRODUCTO:\s*([^,]+?)(?=\s*,\s*(?:MARCA|CANTIDAD|REFERENCIA|MODELO|CADENA|KIT|$))',
-        r',\s*PRODUCTO:\s*([^,\.;:]+?)(?=\s*[,\.;:]|$)'
-    ]
-    
-    for patron in patrones_producto:
-        matches = re.findall(patron, texto_procesado, re.IGNORECASE)
-        for match in matches:
-            producto = match.strip()
-            producto = re.sub(r'[,;\.:\s]+$', '', producto)
-            if producto and len(producto) > 2 and producto.upper() not in ['NO TIENE', 'NO ESPECIFICADO']:
-                productos.add(producto)
-    
-    return list(productos) if productos else ['NO ESPECIFICADO']
+    coincidencias = [textos.str.extractall(patron)[0] for patron in patrones]
+    return pd.concat(coincidencias).droplevel('match')
 
 
-def extraer_marcas_kits(texto_procesado):
+def _coincidencias_etiqueta(textos, patrones):
     """
-    Extrae marcas específicas para kits del texto procesado.
+    Busca una etiqueta con sus dos patrones (etiqueta con coma opcional y etiqueta tras coma
+    con valor corto) y devuelve las coincidencias indexadas por fila en el mismo orden que
+    tendrían tres búsquedas separadas: tras coma, etiqueta general y valor corto.
     """
-    marcas = set()
-    
-    patrones_marca = [
-        r',\s*MARCA:\s*([^,]+?)(?=\s*,\s*(?:MODELO|REFERENCIA|CANTIDAD|PRODUCTO|CADENA|KIT|$))',
-        r'MARCA:\s*([^,]+?)(?=\s*,\s*(?:MODELO|REFERENCIA|CANTIDAD|PRODUCTO|CADENA|KIT|$))',
-        r',\s*MARCA:\s*([^,\.;:]+?)(?=\s*[,\.;:]|$)'
+    patron_etiqueta, patron_corto = patrones
+    etiquetas = textos.str.extractall(patron_etiqueta)
+    coincidencias = [
+        etiquetas.loc[etiquetas['coma'].notna(), 'valor'],
+        etiquetas['valor'],
+        textos.str.extractall(patron_corto)[0]
     ]
-    
-    for patron in patrones_marca:
-        matches = re.findall(patron, texto_procesado, re.IGNORECASE)
-        for match in matches:
-            marca = match.strip()
-            marca = re.sub(r'[,;\.:\s]+$', '', marca)
-            if marca and len(marca) > 1 and marca.upper() not in ['NO TIENE', 'NO ESPECIFICADA']:
-                marcas.add(marca)
+    return pd.concat(coincidencias).droplevel('match')
 
-    return list(marcas) if marcas else ['NO ESPECIFICADA']
+
+def _agrupar_por_fila(valores, indice, defecto):
+    """
+    Agrupa las coincidencias por fila sin duplicados; las filas sin coincidencias reciben el valor por defecto.
+    """
+    grupos = {}
+    for fila, valor in zip(valores.index, valores):
+        grupos.setdefault(fila, set()).add(valor)
+    return pd.Series([list(grupos[fila]) if fila in grupos else list(defecto) for fila in indice], index=indice)
 
 
-def extraer_referencias_kits(texto_procesado):
+def _limpiar_coincidencias(valores):
     """
-    Extrae referencias específicas para kits del texto procesado.
+    Elimina espacios y signos de puntuación sobrantes al final de cada coincidencia.
     """
-    referencias = set()
-    
-    patrones_referencia = [
-        r',\s*REFERENCIA:\s*([^,]+?)(?=\s*,\s*(?:MARCA|CANTIDAD|PRODUCTO|MODELO|CADENA|KIT|$))',
-        r'REFERENCIA:\s*([^,]+?)(?=\s*,\s*(?:MARCA|CANTIDAD|PRODUCTO|MODELO|CADENA|KIT|$))',
-        r',\s*REFERENCIA:\s*([^,\.;:]+?)(?=\s*[,\.;:]|$)'
-    ]
-    
-    for patron in patrones_referencia:
-        matches = re.findall(patron, texto_procesado, re.IGNORECASE)
-        for match in matches:
-            referencia = match.strip()
-            referencia = re.sub(r'[,;\.:\s]+$', '', referencia)
-            if referencia and len(referencia) > 1 and referencia.upper() not in ['NO TIENE', 'NO ESPECIFICADA']:
-                referencias.add(referencia)
-    
-    return list(referencias) if referencias else ['NO ESPECIFICADA']
+    return valores.str.strip().str.replace(_RECORTE_FINAL, '', regex=True)
 
 
-def extraer_modelos(texto_procesado):
+def _extraer_campo(textos_procesados, patrones, longitud_minima, defecto):
     """
-    Extrae modelos del texto procesado.
+    Extrae los valores de un campo etiquetado de toda la columna, descartando los valores
+    demasiado cortos y los marcadores de campo vacío.
     """
-    modelos = set()
-    
-    patrones_modelo = [
-        r',\s*MODELO:\s*([^,]+?)(?=\s*,\s*(?:MARCA|CANTIDAD|PRODUCTO|REFERENCIA|CADENA|KIT|$))',
-        r'MODELO:\s*([^,]+?)(?=\s*,\s*(?:MARCA|CANTIDAD|PRODUCTO|REFERENCIA|CADENA|KIT|$))',
-        r',\s*MODELO:\s*([^,\.;:]+?)(?=\s*[,\.;:]|$)'
-    ]
-    
-    for patron in patrones_modelo:
-        matches = re.findall(patron, texto_procesado, re.IGNORECASE)
-        for match in matches:
-            modelo = match.strip()
-            modelo = re.sub(r'[,;\.:\s]+$', '', modelo)
-            if modelo and len(modelo) > 1 and modelo.upper() not in ['NO TIENE', 'NO ESPECIFICADO']:
-                modelos.add(modelo)
-    
-    return list(modelos) if modelos else ['NO ESPECIFICADO']
+    valores = _limpiar_coincidencias(_coincidencias_etiqueta(textos_procesados, patrones))
+    validos = (valores.str.len() > longitud_minima) & ~valores.str.upper().isin(['NO TIENE', defecto])
+
+    return _agrupar_por_fila(valores[validos], textos_procesados.index, [defecto])
 
 
-def extraer_cantidades_kits(texto_procesado):
+def extraer_productos(textos_procesados):
     """
-    Extrae cantidades específicas para kits del texto procesado.
+    Extrae productos de la columna de textos procesados.
     """
-    cantidades = set()
-    
-    patrones_cantidad = [
-        r'(\d+(?:\.\d+)?)\s*(?:UNIDADES?|PIEZA|KILOS|UND)',
-        r',\s*CANTIDAD:\s*(\d+)\s*UNIDADES?',
-        r',\s*CANTIDAD:\s*(\d+)\s*UND?',
-        r',\s*CANTIDAD:\s*\(?(\d+)\)?\s*U(?!NIDAD)',
-        r',\s*CANTIDAD:\s*(\d+)',
-        r'CANTIDAD:\s*(\d+(?:\.\d+)?)\s*(?:UNIDADES?|UND)',
-        r'CANT\s*\(\s*(\d+(?:\.\d+)?)\s*U\s*\)'
-    ]
-    
-    for patron in patrones_cantidad:
-        matches = re.findall(patron, texto_procesado, re.IGNORECASE)
-        for match in matches:
-            try:
-                cantidad = float(match)
-                if cantidad > 0:
-                    cantidades.add(int(cantidad))
-            except ValueError:
-                continue
-    
-    return sorted(list(cantidades)) if cantidades else [0]
+    return _extraer_campo(textos_procesados, _PATRONES_PRODUCTO, 2, 'NO ESPECIFICADO')
 
 
-def detectar_cadenas(texto_procesado):
+def extraer_marcas_kits(textos_procesados):
     """
-    Detecta si el producto es una cadena o kit de arrastre.
+    Extrae marcas específicas para kits de la columna de textos procesados.
     """
-    patrones_cadena = [
-        r'CADENA',
-        r'CHAIN',
-        r'CADENILLA',
-        r'KIT\s+ARRASTRE',
-        r'KIT\s+DE\s+ARRASTRE'
-    ]
-    
-    for patron in patrones_cadena:
-        if re.search(patron, texto_procesado, re.IGNORECASE):
-            return True
-    
-    return False
+    return _extraer_campo(textos_procesados, _PATRONES_MARCA, 1, 'NO ESPECIFICADA')
 
 
-def extraer_pasos_medidas(texto_procesado):
+def extraer_referencias_kits(textos_procesados):
     """
-    Extrae pasos y medidas de cadenas del texto procesado.
+    Extrae referencias específicas para kits de la columna de textos procesados.
     """
-    pasos = []
-    
-    patrones_paso = [
-        r'(\d+H[-\s]*\d*L?)',
-        r'(\d+\s*H)',
-        r'(\d+\.\d+\s*MM)',
-        r'(\d+MM)',
-        r'PASO:\s*([^,]+?)(?=\s*,|$)',
-        r'MEDIDA:\s*([^,]+?)(?=\s*,|$)'
-    ]
-    
-    for patron in patrones_paso:
-        matches = re.findall(patron, texto_procesado, re.IGNORECASE)
-        for match in matches:
-            paso = match.strip()
-            if paso and len(paso) > 1:
-                pasos.append(paso)
+    return _extraer_campo(textos_procesados, _PATRONES_REFERENCIA, 1, 'NO ESPECIFICADA')
+
+
+def extraer_modelos(textos_procesados):
+    """
+    Extrae modelos de la columna de textos procesados.
+    """
+    return _extraer_campo(textos_procesados, _PATRONES_MODELO, 1, 'NO ESPECIFICADO')
+
+
+def extraer_cantidades_kits(textos_procesados):
+    """
+    Extrae cantidades específicas para kits de la columna de textos procesados.
+    """
+    coincidencias = _coincidencias_por_fila(textos_procesados, _PATRONES_CANTIDAD)
+    # Las coincidencias siempre son números. Se pasan a float y se filtran los positivos antes
+    # de truncar con int de Python, como int(float(valor)): 0.5 aporta un 0 y las cifras largas
+    # no desbordan int64. Un número demasiado largo para float (infinito) se ignora
+    numeros = coincidencias.astype('float64')
+    valores = numeros[(numeros > 0) & (numeros < float('inf'))].map(int)
+    cantidades = _agrupar_por_fila(valores, textos_procesados.index, [0])
     
-    return pasos if pasos else ['N/A']
+    return cantidades.map(sorted)
 
 
-def procesar_linea_kits(descripcion, numero_aceptacion, cantidad_original, expresiones_regulares, diccionario):
+def detectar_cadenas(textos_procesados):
     """
-    Procesa una línea completa del archivo de importación para kits y cadenas.
+    Detecta si cada producto de la columna es una cadena o kit de arrastre.
     """
-    print(f"Entrando a procesar_linea_kits")
+    return textos_procesados.str.contains(_PATRON_CADENA.pattern, flags=re.IGNORECASE, regex=True)
 
-    # Limpiar y normalizar el texto
-    texto_limpio = limpiar_y_normalizar_texto_kits(descripcion, expresiones_regulares)
- 
-    # Aplicar reemplazos del diccionario
-    texto_procesado = aplicar_reemplazos_diccionario_kits(texto_limpio, diccionario)
 
-    # Extraer datos estructurados
-    productos = extraer_productos(texto_procesado)
-    marcas = extraer_marcas_kits(texto_procesado)
-    referencias = extraer_referencias_kits(texto_procesado)
-    modelos = extraer_modelos(texto_procesado)
-    cantidades = extraer_cantidades_kits(texto_procesado)
-    es_cadena = detectar_cadenas(texto_procesado)
-    pasos_medidas = extraer_pasos_medidas(texto_procesado)
+def extraer_pasos_medidas(textos_procesados):
+    """
+    Extrae pasos y medidas de cadenas de la columna de textos procesados.
+    """
+    pasos = _coincidencias_por_fila(textos_procesados, _PATRONES_PASO).str.strip()
+    pasos = pasos[pasos.str.len() > 1]
+    agrupados = pasos.groupby(level=0, sort=False).agg(list)
     
-   # Procesar cantidad original
+    return pd.Series([agrupados[fila] if fila in agrupados.index else ['N/A'] for fila in textos_procesados.index],
+                     index=textos_procesados.index)
+
+
+def _cantidad_entera(valor):
+    """
+    Convierte la cantidad original a entero, o 0 si no es un número válido.
+    """
     try:
-        cantidad_limpia = re.sub(r"(\d+)[.,\s]00\b", r"\1", str(cantidad_original))
-        cantidad_original_int = int(float(cantidad_limpia))
-    except (ValueError, TypeError):
-        cantidad_original_int = 0
-    
+        return int(float(valor))
+    except (ValueError, TypeError, OverflowError):
+        return 0
+
+
+def _completar_columna(valores, n, defecto):
+    """
+    Devuelve n valores de la lista repitiendo el último, o el valor por defecto si está vacía.
+    """
+    if not valores:
+        return [defecto] * n
+    if len(valores) == n:
+        return valores
+    return valores[:n] + [valores[-1]] * (n - len(valores))
+
+
+def procesar_linea_kits(numero_aceptacion, cantidad_original, cantidad_original_int, productos, marcas, referencias, modelos, cantidades, es_cadena):
+    """
+    Construye los registros de una línea del archivo de importación para kits y cadenas
+    a partir de los datos ya extraídos de su descripción, como un diccionario de columnas.
+    """
     # Si no se encontraron cantidades en el texto, usar la cantidad original
     if not cantidades or cantidades == [0]:
         cantidades = [cantidad_original_int]
     
-    #Crear archivo debug 
-    debug_file = 'debug_kits.txt'
-    with open(debug_file, 'w', encoding='utf-8') as f: 
-        for producto in productos:
-            f.write(f"Producto: {producto}\n")
-
-    # Crear registros únicos
-    registros = []
-    max_elementos = max(len(productos), len(marcas), len(referencias), len(modelos), 1)
-    
-    for i in range(max_elementos):
-        producto = productos[min(i, len(productos)-1)] if productos else 'NO ESPECIFICADO'
-        marca = marcas[min(i, len(marcas)-1)] if marcas else 'NO ESPECIFICADA'
-        referencia = referencias[min(i, len(referencias)-1)] if referencias else 'NO ESPECIFICADA'
-        modelo = modelos[min(i, len(modelos)-1)] if modelos else 'NO ESPECIFICADO'
-        cantidad = cantidades[min(i, len(cantidades)-1)] if cantidades else cantidad_original_int
-        
-        registro = {
-            'numero_aceptacion': numero_aceptacion,
-            'producto': producto,
-            'marca': marca,
-            'referencia': referencia,
-            'modelo': modelo,
-            'cantidad': cantidad,
-            'unidad': 'UNIDADES',
-            'es_cadena': 'SÍ' if es_cadena else 'NO',
-            'pasos_medidas': 'N/A', 
-            # Verificacion de los pasos de las cadenas
-            #'pasos_medidas': ', '.join(pasos_medidas),
-            'cantidad_original': cantidad_original,
-            'fecha_procesamiento': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        }
-        
-        if registro not in registros:
-            registros.append(registro)
+    # Crear registros por columnas; los valores faltantes repiten el último encontrado
+    n = max(len(productos), len(marcas), len(referencias), len(modelos), 1)
+    registros = {
+        'numero_aceptacion': [numero_aceptacion] * n,
+        'producto': _completar_columna(productos, n, 'NO ESPECIFICADO'),
+        'marca': _completar_columna(marcas, n, 'NO ESPECIFICADA'),
+        'referencia': _completar_columna(referencias, n, 'NO ESPECIFICADA'),
+        'modelo': _completar_columna(modelos, n, 'NO ESPECIFICADO'),
+        'cantidad': _completar_columna(cantidades, n, cantidad_original_int),
+        'unidad': ['UNIDADES'] * n,
+        'es_cadena': ['SÍ' if es_cadena else 'NO'] * n,
+        'pasos_medidas': ['N/A'] * n,
+        # Verificacion de los pasos de las cadenas
+        #'pasos_medidas': [', '.join(pasos_medidas)] * n,
+        'cantidad_original': [cantidad_original] * n
+    }
 
     return registros
 
 
-def procesar_archivo_kits(directorio_salida, archivo_entrada, archivo_salida, archivo_diccionario="diccionario_kits.json", archivo_expresiones="expresiones_regulares_kits.json"):
+def _quitar_decimales_cero(cantidades):
+    """
+    Quita los decimales en cero de las cantidades originales (12.00 -> 12).
+    """
+    # Caso habitual: un entero seguido de .00 / ,00, que se resuelve recortando el texto
+    enteros = cantidades.str[:-3]
+    simples = enteros.str.isdigit() & cantidades.str[-3:].isin(['.00', ',00', ' 00'])
+    resultado = enteros.where(simples, cantidades)
+
+    # El resto de formatos pasa por la expresión regular
+    otras = ~simples
+    if otras.any():
+        resultado[otras] = cantidades[otras].str.replace(_DECIMALES_CERO, r'\1', regex=True)
+    return resultado
+
+
+def _procesar_bloque_kits(bloque, diccionario, expresiones_compiladas):
+    """
+    Procesa un bloque de filas del archivo de kits y devuelve sus registros, ya sin
+    duplicados dentro del bloque, y el número de líneas procesadas.
+    """
+    numeros_aceptacion = bloque['numeroaceptacion'].str.strip()
+    cantidades_originales = bloque['cantidad'].str.strip()
+    cantidades_enteras = _quitar_decimales_cero(cantidades_originales).map(_cantidad_entera)
+
+    # Limpiar, normalizar y aplicar reemplazos del diccionario sobre la columna completa
+    textos_limpios = limpiar_y_normalizar_texto_kits(bloque['descripcion'], expresiones_compiladas)
+    textos_procesados = aplicar_reemplazos_diccionario_kits(textos_limpios, diccionario)
+
+    # Extraer datos estructurados de todas las líneas
+    productos = extraer_productos(textos_procesados)
+    marcas = extraer_marcas_kits(textos_procesados)
+    referencias = extraer_referencias_kits(textos_procesados)
+    modelos = extraer_modelos(textos_procesados)
+    cantidades = extraer_cantidades_kits(textos_procesados)
+    es_cadena = detectar_cadenas(textos_procesados)
+
+    resultados = {campo: [] for campo in CAMPOS_SALIDA_KITS if campo != 'fecha_procesamiento'}
+    # Métodos extend resueltos una vez, en el mismo orden de campos que devuelve procesar_linea_kits
+    extensores = [resultados[campo].extend for campo in resultados]
+    lineas_procesadas = 0
+    for fila in zip(numeros_aceptacion, cantidades_originales, cantidades_enteras, productos, marcas,
+                    referencias, modelos, cantidades, es_cadena):
+        try:
+            registros_linea = procesar_linea_kits(*fila)
+        except Exception:
+            continue
+        for extender, valores in zip(extensores, registros_linea.values()):
+            extender(valores)
+        lineas_procesadas += 1
+
+    # Eliminar duplicados del bloque antes de devolverlo al proceso principal
+    registros = pd.DataFrame(resultados, columns=CAMPOS_SALIDA_KITS).drop_duplicates(
+        subset=CLAVE_UNICA_KITS, keep='first')
+
+    return registros, lineas_procesadas
+
+
+def _iniciar_trabajador_kits(diccionario, expresiones_compiladas):
+    """
+    Guarda en el proceso trabajador la configuración que comparten todos sus bloques.
+    """
+    _CONFIG_TRABAJADOR['diccionario'] = diccionario
+    _CONFIG_TRABAJADOR['expresiones_compiladas'] = expresiones_compiladas
+
+
+def _procesar_bloque_trabajador(bloque):
+    """
+    Procesa un bloque en un proceso trabajador con la configuración fijada al iniciarlo.
+    """
+    return _procesar_bloque_kits(bloque, _CONFIG_TRABAJADOR['diccionario'],
+                                 _CONFIG_TRABAJADOR['expresiones_compiladas'])
+
+
+def _procesar_bloques_kits(bloques, diccionario, expresiones_compiladas):
+    """
+    Procesa los bloques en orden, en paralelo cuando hay más de uno, y entrega el resultado
+    de cada bloque a medida que está listo.
+    """
+    if len(bloques) > 1:
+        # La configuración se envía una vez a cada proceso y no con cada bloque
+        with ProcessPoolExecutor(max_workers=os.cpu_count(), initializer=_iniciar_trabajador_kits,
+                                 initargs=(diccionario, expresiones_compiladas)) as executor:
+            yield from executor.map(_procesar_bloque_trabajador, bloques)
+    else:
+        for bloque in bloques:
+            yield _procesar_bloque_kits(bloque, diccionario, expresiones_compiladas)
+
+
+def procesar_archivo_kits(directorio_salida, archivo_entrada, archivo_salida, archivo_diccionario="diccionario_kits.json", archivo_expresiones="expresiones_regulares_kits.json", df_entrada=None):
     """
     Función principal que procesa el archivo de importación completo para kits y cadenas.
+    Si se recibe df_entrada (el DataFrame de procesar_archivos_raw) no se vuelve a leer el CSV.
     """
     
     print(f"Entrando a procesar_archivo_kits")
@@ -537,10 +702,8 @@ def procesar_archivo_kits(directorio_salida, archivo_entrada, archivo_salida, ar
         print("No se encontraron expresiones regulares para kits. Asegúrese de que el archivo JSON esté correctamente configurado.")
         return
 
-    # Procesar archivo línea por línea
-    resultados = []
+    # Procesar archivo como columnas de un DataFrame
     lineas_procesadas = 0
-    lineas_con_error = 0
 
     archivo_salida = os.path.join(directorio_salida, archivo_salida)
     archivo_entrada = os.path.join(directorio_salida, archivo_entrada)
@@ -548,90 +711,99 @@ def procesar_archivo_kits(directorio_salida, archivo_entrada, archivo_salida, ar
     if not os.path.exists(directorio_salida):
         os.makedirs(directorio_salida)
     
-    try:
-        with open(archivo_entrada, 'r', encoding='utf-8') as archivo:
-            for numero_linea, linea in enumerate(archivo, 1):
-                linea = linea.strip()
-                if not linea:
-                    continue
-                
-                try:
-                    partes = linea.split('|')
-                    if len(partes) >= 4:
-                        numero_aceptacion = partes[0].strip()
-                        descripcion = '|'.join(partes[1:-2]).strip()
-                        cantidad_original = partes[-2].strip()
-                        
-                        registros_linea = procesar_linea_kits(
-                            descripcion, numero_aceptacion, cantidad_original, 
-                            expresiones_regulares, diccionario
-                        )
-                        
-                        resultados.extend(registros_linea)    
-                        lineas_procesadas += 1
-                        
-                    else:
-                        lineas_con_error += 1
-                        
-                except Exception as e:
-                    lineas_con_error += 1
-                    continue
-    
-    except FileNotFoundError:
-        print(f"Error: No se pudo encontrar el archivo {archivo_entrada}")
-        return
-    except Exception as e:
-        print(f"Error al leer el archivo: {e}")
-        return
-
-    # Eliminar duplicados finales
-    registros_unicos = []
-    registros_vistos = set()
-    
-    for registro in resultados:
-        clave_unica = (
-            registro['numero_aceptacion'],
-            registro['producto'],
-            registro['marca'],
-            registro['referencia'],
-            registro['modelo'],
-            registro['cantidad']
-        )
+    if df_entrada is not None:
+        # El DataFrame se pasa a texto en memoria igual que lo escribe procesar_archivos_raw en
+        # el CSV intermedio, para que sus líneas se separen exactamente como al leer el archivo
+        contenido = df_entrada.to_csv(index=False, sep='|')
+    else:
+        try:
+            with open(archivo_entrada, 'r', encoding='utf-8') as archivo:
+                contenido = archivo.read()
         
-        if clave_unica not in registros_vistos:
-            registros_vistos.add(clave_unica)
-            registros_unicos.append(registro)
+        except FileNotFoundError:
+            print(f"Error: No se pudo encontrar el archivo {archivo_entrada}")
+            return
+        except Exception as e:
+            print(f"Error al leer el archivo: {e}")
+            return
+
+    # No se usa read_csv porque cada línea física es un registro: la descripción puede
+    # contener '|' y comillas sin escapar. Desde pandas 3, con pyarrow instalado, dtype=str
+    # deja las líneas en Arrow para quitar espacios y contar separadores (requirements.txt
+    # exige pandas>=3)
+    lineas = pd.Series(contenido.split('\n'), dtype=str).str.strip()
+    del contenido
+
+    # Separar los campos de las líneas con al menos 4 partes: el número de aceptación es la
+    # primera, la cantidad la penúltima y la descripción todo lo que queda entre ellas
+    lineas = lineas[lineas != '']
+    campos = lineas[lineas.str.count(r'\|') >= 3].str.rsplit('|', n=2)
+    inicio = campos.str[0].str.split('|', n=1)
+    df = pd.DataFrame({
+        'numeroaceptacion': inicio.str[0],
+        'descripcion': inicio.str[1].str.strip(),
+        'cantidad': campos.str[1]
+    })
+    if df.empty:
+        # Un archivo vacío o sin líneas válidas deja la salida solo con el encabezado
+        print(f"El archivo {archivo_entrada} no tiene líneas con registros para procesar")
+
+    # Compilar una sola vez las expresiones de normalización para todos los bloques
+    expresiones_compiladas = compilar_expresiones_ordenadas(expresiones_regulares)
 
-    # Escribir archivo de salida
+    # Todos los registros de una ejecución comparten la misma fecha de procesamiento
+    fecha_procesamiento = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+    bloques = [df.iloc[inicio:inicio + TAMANO_BLOQUE_KITS] for inicio in range(0, len(df), TAMANO_BLOQUE_KITS)]
+    claves_vistas = set()
+    marcas_vistas = set()
+    productos_debug = []
+    total_productos = 0
+    productos_cadenas = 0
+
+    # Escribir archivo de salida a medida que se procesa cada bloque
     try:
-        with open(archivo_salida, 'w', newline='', encoding='utf-8') as csvfile:
-            fieldnames = [
-                'numero_aceptacion', 'producto', 'marca', 'referencia', 'modelo', 
-                'cantidad', 'unidad', 'es_cadena', 'pasos_medidas', 'cantidad_original', 
-                'fecha_procesamiento'
-            ]
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames, delimiter='|')
-            
-            writer.writeheader()
-            for resultado in registros_unicos:
-                writer.writerow(resultado)
-        
-        # Generar estadísticas
-        total_productos = len(registros_unicos)
-        productos_cadenas = len([r for r in registros_unicos if r['es_cadena'] == 'SÍ'])
-        marcas_unicas = len(set(r['marca'] for r in registros_unicos if r['marca'] != 'NO ESPECIFICADA'))
+        # Búfer de 1 MB para agrupar las escrituras del archivo de salida
+        with open(archivo_salida, 'w', newline='', encoding='utf-8', buffering=1 << 20) as csvfile:
+            csvfile.write('|'.join(CAMPOS_SALIDA_KITS) + '\r\n')
+
+            for registros_bloque, lineas_bloque in _procesar_bloques_kits(bloques, diccionario, expresiones_compiladas):
+                lineas_procesadas += lineas_bloque
+                if DEBUG_KITS:
+                    productos_debug.extend(registros_bloque['producto'])
+
+                # La fecha es la misma para todos los registros y se asigna como un único valor
+                registros = registros_bloque.assign(fecha_procesamiento=fecha_procesamiento)
+
+                # Eliminar los registros ya escritos en bloques anteriores. La clave es la tupla
+                # exacta de sus campos: un hash más corto podría confundir dos registros distintos
+                claves = list(zip(*(registros[campo] for campo in CLAVE_UNICA_KITS)))
+                nuevos = [clave not in claves_vistas for clave in claves]
+                claves_vistas.update(claves)
+                registros = registros[nuevos]
+
+                registros.to_csv(csvfile, sep='|', index=False, header=False, lineterminator='\r\n')
+
+                # Acumular estadísticas
+                total_productos += len(registros)
+                productos_cadenas += int((registros['es_cadena'] == 'SÍ').sum())
+                marcas_vistas.update(registros.loc[registros['marca'] != 'NO ESPECIFICADA', 'marca'].unique())
+
+        #Crear archivo debug 
+        if DEBUG_KITS:
+            with open('debug_kits.txt', 'w', encoding='utf-8') as f:
+                f.writelines(f"Producto: {producto}\n" for producto in productos_debug)
         
         # Mostrar resultado final
         print(f"Procesamiento completado: {lineas_procesadas} líneas procesadas")
         print(f"Registros únicos generados: {total_productos}")
         print(f"Productos con cadenas: {productos_cadenas}")
-        print(f"Marcas únicas identificadas: {marcas_unicas}")
+        print(f"Marcas únicas identificadas: {len(marcas_vistas)}")
         print(f"Archivo de salida: {archivo_salida}")
         
     except Exception as e:
         print(f"Error al escribir el archivo de salida: {e}")
 
-
 if __name__ == "__main__":
     directorio_salida = 'data'
     archivo_entrada = "dataraw.csv"
@@ -639,8 +811,10 @@ if __name__ == "__main__":
     archivo_diccionario = "diccionario_kits.json"
     archivo_expresiones = "expresiones_regulares_kits.json"
     
+    # Con procesar_archivos_raw activo, su DataFrame se pasa directo sin releer dataraw.csv
+    df_raw = None
     # print(f"Inicio de proceso de archivos de Excel para Kits")
-    #procesar_archivos_raw(directorio_salida, archivo_entrada)
+    #df_raw = procesar_archivos_raw(directorio_salida, archivo_entrada)
 
     print(f"Inicio de proceso de archivo de Kits y Cadenas")
-    procesar_archivo_kits(directorio_salida, archivo_entrada, archivo_salida, archivo_diccionario, archivo_expresiones)
\ No newline at end of file
+    procesar_archivo_kits(directorio_salida, archivo_entrada, archivo_salida, archivo_diccionario, archivo_expresiones, df_entrada=df_raw)
\ No newline at end of file
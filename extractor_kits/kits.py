@@ -15,12 +15,61 @@ Fecha: 2025
 import re
 import pandas as pd
 import numpy as np
-from typing import List, Dict, Optional, Tuple
+from typing import List, Dict, Optional, Tuple, Iterator
 import argparse
 import logging
 from pathlib import Path
 import json
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+from itertools import chain, islice
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Patrones de cantidad y unidad juntos
+_PATRONES_CANTIDAD_UNIDAD = [re.compile(patron, re.IGNORECASE) for patron in [
+    r'(\d+(?:\.\d+)?)\s*(Unidad|Pieza|Kilos|UND)',
+    r'CANTIDAD\s+(\d+(?:\.\d+)?)\s+(UNIDADES)',
+    r'CANT\s*\(\s*(\d+(?:\.\d+)?)\s*(U)\s*\)'
+]]
+
+# Unidad abreviada de CANT (n U), capturada en mayúscula o minúscula
+_UNIDADES_ABREVIADAS = {'U': 'Unidad', 'u': 'Unidad'}
+
+# Patrón de cantidad y producto juntos
+_PATRON_PRODUCTO_CANTIDAD = re.compile(
+    r'(\d+(?:\.\d+)?)\s*(Unidad|Pieza|Kilos)\s+PRODUCTO\s*[=:]\s*([^,;|]+?)(?:,|;|USO\s*=)',
+    re.IGNORECASE
+)
+
+# Registros por bloque al repartir el procesamiento entre procesos
+TAMANO_BLOQUE_REGISTROS = 10000
+
+
+class _TablaLimpieza(dict):
+    """
+    Tabla para str.translate que reemplaza por espacio todo carácter que no sea letra,
+    dígito, espacio, '_' o '-/().'; cada carácter se clasifica la primera vez que aparece.
+    """
+    
+    def __missing__(self, codigo: int):
+        caracter = chr(codigo)
+        valido = caracter.isalnum() or caracter.isspace() or caracter in '_-/().'
+        self[codigo] = codigo if valido else ' '
+        return self[codigo]
+
+
+_TABLA_LIMPIEZA = _TablaLimpieza()
+
+
+def _limpiar_valor(texto: str) -> str:
+    """Reemplaza los caracteres no válidos y normaliza los espacios de un valor extraído."""
+    return ' '.join(texto.translate(_TABLA_LIMPIEZA).split())
 
 
 class ImportacionAnalyzer:
@@ -42,6 +91,11 @@ class ImportacionAnalyzer:
         self.data = []
         self.setup_logging(log_level)
         
+        # Resultados derivados de self.data, calculados una sola vez por procesamiento
+        self._detailed_df = None
+        self._summary_df = None
+        self._stats = None
+        
         # Patrones de expresiones regulares para extracción
         self.patterns = {
             'producto': [
@@ -66,9 +120,25 @@ class ImportacionAnalyzer:
                 r'(\d+(?:\.\d+)?)\s*UND'
             ],
             'unidad': r'(Unidad|Pieza|Kilos|UND)',
-            'cadena': r'CADENA|CHAIN|CADENILLA|KIT\s+ARRASTRE',
+            # Alternativas agrupadas por prefijo común (CADENA, CADENILLA)
+            'cadena': r'CADEN(?:A|ILLA)|CHAIN|KIT\s+ARRASTRE',
             'paso': r'(\d+H[-\s]*\d*L?|\d+\s*H|\d+\.\d+\s*MM|\d+MM)'
         }
+        
+        # Los patrones se compilan una sola vez, sin distinguir mayúsculas
+        for campo, patron in self.patterns.items():
+            if isinstance(patron, list):
+                self.patterns[campo] = [re.compile(p, re.IGNORECASE) for p in patron]
+            else:
+                self.patterns[campo] = re.compile(patron, re.IGNORECASE)
+        
+        # Texto (en minúsculas) que contiene cualquier coincidencia de los patrones de cada campo
+        self.etiquetas = {
+            'producto': ('producto', 'nombre comerc'),
+            'marca': ('marca',),
+            'referencia': ('ref',),
+            'modelo': ('modelo',)
+        }
     
     def setup_logging(self, level: str) -> None:
         """Configura el sistema de logging."""
@@ -97,52 +167,134 @@ class ImportacionAnalyzer:
             UnicodeDecodeError: Si hay problemas de codificación
         """
         try:
-            with open(file_path, 'r', encoding='utf-8') as file:
-                content = file.read()
-            self.logger.info(f"Archivo cargado exitosamente: {file_path}")
-            return content
+            # El archivo se lee una sola vez; las codificaciones se prueban sobre los bytes en memoria
+            raw = Path(file_path).read_bytes()
         except FileNotFoundError:
             self.logger.error(f"Archivo no encontrado: {file_path}")
             raise
+        
+        try:
+            content = self._decode_text(raw, 'utf-8')
+            self.logger.info(f"Archivo cargado exitosamente: {file_path}")
+            return content
         except UnicodeDecodeError:
             # Intentar con diferentes codificaciones
-            encodings = ['utf-8', 'latin-1', 'cp1252', 'iso-8859-1']
+            encodings = ['latin-1', 'cp1252', 'iso-8859-1']
             for encoding in encodings:
                 try:
-                    with open(file_path, 'r', encoding=encoding) as file:
-                        content = file.read()
+                    content = self._decode_text(raw, encoding)
                     self.logger.info(f"Archivo cargado con codificación {encoding}: {file_path}")
                     return content
                 except UnicodeDecodeError:
                     continue
             raise UnicodeDecodeError("No se pudo decodificar el archivo con ninguna codificación")
     
-    def extract_with_pattern(self, content: str, patterns: List[str]) -> List[str]:
+    @staticmethod
+    def _decode_text(raw: bytes, encoding: str) -> str:
+        """Decodifica los bytes con los mismos saltos de línea que la lectura en modo texto."""
+        return raw.decode(encoding).replace('\r\n', '\n').replace('\r', '\n')
+    
+    def iter_records(self, file_path: str, encoding: str = 'utf-8') -> Iterator[str]:
+        """
+        Recorre el archivo línea por línea y devuelve cada registro no vacío, sin
+        cargar el contenido completo en memoria.
+        
+        Args:
+            file_path (str): Ruta al archivo de texto
+            encoding (str): Codificación del archivo
+            
+        Yields:
+            str: Registro sin espacios al inicio y al final
+            
+        Raises:
+            FileNotFoundError: Si el archivo no existe
+            UnicodeDecodeError: Si el archivo no está en la codificación indicada
+        """
+        try:
+            with open(file_path, 'r', encoding=encoding) as file:
+                for line in file:
+                    record = line.strip()
+                    if record:
+                        yield record
+        except FileNotFoundError:
+            self.logger.error(f"Archivo no encontrado: {file_path}")
+            raise
+    
+    def extract_with_pattern(self, content: str, patterns: List[re.Pattern]) -> List[str]:
         """
         Extrae información usando múltiples patrones de regex.
         
         Args:
             content (str): Contenido a analizar
-            patterns (List[str]): Lista de patrones regex
+            patterns (List[re.Pattern]): Lista de patrones regex compilados
             
         Returns:
             List[str]: Lista de coincidencias encontradas
         """
         matches = []
         for pattern in patterns:
-            found = re.findall(pattern, content, re.IGNORECASE)
+            found = pattern.findall(content)
             if found:
                 # Limpiar y procesar las coincidencias
                 cleaned = [match.strip() for match in found if match.strip()]
                 matches.extend(cleaned)
         
         # Eliminar duplicados manteniendo el orden
-        unique_matches = []
-        for match in matches:
-            if match not in unique_matches:
-                unique_matches.append(match)
+        return list(dict.fromkeys(matches))
+    
+    def extract_field(self, content: str, campo: str) -> List[str]:
+        """
+        Extrae y limpia los valores de un campo. Si ninguna etiqueta del campo aparece en
+        el contenido, se omite la búsqueda con sus patrones.
+        
+        Args:
+            content (str): Contenido a analizar
+            campo (str): Campo a extraer (producto, marca, referencia, modelo)
+            
+        Returns:
+            List[str]: Lista de valores limpiados
+        """
+        contenido = content.lower()
+        if not any(etiqueta in contenido for etiqueta in self.etiquetas[campo]):
+            return []
+        
+        valores = self.extract_with_pattern(content, self.patterns[campo])
+        return self.clean_extracted_data(valores)
+    
+    def extract_field_column(self, contents: pd.Series, campo: str) -> pd.Series:
+        """
+        Extrae y limpia los valores de un campo para una columna completa de contenidos,
+        con el mismo resultado que extract_field aplicado a cada contenido.
         
-        return unique_matches
+        Args:
+            contents (pd.Series): Contenidos a analizar
+            campo (str): Campo a extraer (producto, marca, referencia, modelo)
+            
+        Returns:
+            pd.Series: Lista de valores limpiados por contenido
+        """
+        # Solo se buscan los patrones en los contenidos que tienen alguna etiqueta del campo
+        minusculas = contents.str.lower()
+        con_etiqueta = pd.Series(False, index=contents.index)
+        for etiqueta in self.etiquetas[campo]:
+            con_etiqueta |= minusculas.str.contains(etiqueta, regex=False)
+        candidatos = contents[con_etiqueta]
+        
+        if candidatos.empty:
+            return pd.Series([[] for _ in contents.index], index=contents.index, dtype=object)
+        
+        # Coincidencias de todos los patrones, en el orden de los patrones dentro de cada contenido
+        coincidencias = [candidatos.str.extractall(pattern)[0] for pattern in self.patterns[campo]]
+        valores = pd.concat(coincidencias).droplevel('match').str.strip()
+        valores = valores[valores != '']
+        
+        # Eliminar duplicados de cada contenido manteniendo el orden y limpiar
+        valores = valores[~pd.MultiIndex.from_arrays([valores.index, valores]).duplicated()]
+        valores = valores.map(_limpiar_valor)
+        valores = valores[valores.str.len() > 2]
+        
+        agrupados = valores.groupby(level=0, sort=False).agg(list)
+        return pd.Series([agrupados.get(indice, []) for indice in contents.index], index=contents.index, dtype=object)
     
     def extract_quantities_and_units(self, content: str) -> List[Tuple[float, str]]:
         """
@@ -157,18 +309,12 @@ class ImportacionAnalyzer:
         quantities_units = []
         
         # Buscar patrones que incluyan cantidad y unidad juntos
-        patterns = [
-            r'(\d+(?:\.\d+)?)\s*(Unidad|Pieza|Kilos|UND)',
-            r'CANTIDAD\s+(\d+(?:\.\d+)?)\s+(UNIDADES)',
-            r'CANT\s*\(\s*(\d+(?:\.\d+)?)\s*(U)\s*\)'
-        ]
-        
-        for pattern in patterns:
-            matches = re.findall(pattern, content, re.IGNORECASE)
+        for pattern in _PATRONES_CANTIDAD_UNIDAD:
+            matches = pattern.findall(content)
             for match in matches:
                 try:
                     quantity = float(match[0])
-                    unit = match[1] if match[1].upper() != 'U' else 'Unidad'
+                    unit = _UNIDADES_ABREVIADAS.get(match[1], match[1])
                     if quantity > 0:
                         quantities_units.append((quantity, unit))
                 except (ValueError, IndexError):
@@ -186,12 +332,23 @@ class ImportacionAnalyzer:
         Returns:
             List[Dict]: Lista de productos con cantidades
         """
-        products_with_qty = []
+        return self._extract_products_and_total(content)[0]
+    
+    def _extract_products_and_total(self, content: str) -> Tuple[List[Dict], float]:
+        """
+        Extrae productos con sus cantidades asociadas y suma las cantidades en el mismo recorrido.
         
-        # Buscar patrones que incluyan cantidad y producto juntos
-        product_qty_pattern = r'(\d+(?:\.\d+)?)\s*(Unidad|Pieza|Kilos)\s+PRODUCTO\s*[=:]\s*([^,;|]+?)(?:,|;|USO\s*=)'
+        Args:
+            content (str): Contenido a analizar
+            
+        Returns:
+            Tuple[List[Dict], float]: Lista de productos con cantidades y suma de las cantidades
+        """
+        products_with_qty = []
+        total = 0
         
-        matches = re.findall(product_qty_pattern, content, re.IGNORECASE)
+        # Buscar patrones que incluyan cantidad y producto juntos (requieren la etiqueta PRODUCTO)
+        matches = _PATRON_PRODUCTO_CANTIDAD.findall(content) if 'producto' in content.lower() else []
         for match in matches:
             try:
                 quantity = float(match[0])
@@ -203,15 +360,16 @@ class ImportacionAnalyzer:
                         'unidad': unit,
                         'producto': product
                     })
+                    total += quantity
             except (ValueError, IndexError):
                 continue
         
         # Si no encontramos productos con cantidades específicas, usar patrones separados
         if not products_with_qty:
-            productos = self.extract_with_pattern(content, self.patterns['producto'])
-            productos = self.clean_extracted_data(productos)
+            productos = self.extract_field(content, 'producto')
             
-            cantidades_unidades = self.extract_quantities_and_units(content)
+            # Las cantidades solo se asocian a productos encontrados
+            cantidades_unidades = self.extract_quantities_and_units(content) if productos else []
             
             # Asociar cantidades con productos
             for i, producto in enumerate(productos):
@@ -227,8 +385,9 @@ class ImportacionAnalyzer:
                     'unidad': unidad,
                     'producto': producto
                 })
+                total += cantidad
         
-        return products_with_qty
+        return products_with_qty, total
     
     def clean_extracted_data(self, data: List[str]) -> List[str]:
         """
@@ -243,8 +402,7 @@ class ImportacionAnalyzer:
         cleaned = []
         for item in data:
             # Remover caracteres de control y espacios extra
-            clean_item = re.sub(r'[^\w\s\-/().]', ' ', item)
-            clean_item = re.sub(r'\s+', ' ', clean_item).strip()
+            clean_item = _limpiar_valor(item)
             
             # Filtrar items muy cortos o vacíos
             if len(clean_item) > 2:
@@ -270,32 +428,26 @@ class ImportacionAnalyzer:
         content = parts[1]
         
         # Extraer productos con cantidades
-        productos_con_cantidad = self.extract_products_with_quantities(content)
+        productos_con_cantidad, cantidad_total = self._extract_products_and_total(content)
         
         # Extraer marcas
-        marcas = self.extract_with_pattern(content, self.patterns['marca'])
-        marcas = self.clean_extracted_data(marcas)
+        marcas = self.extract_field(content, 'marca')
         
         # Extraer referencias
-        referencias = self.extract_with_pattern(content, self.patterns['referencia'])
-        referencias = self.clean_extracted_data(referencias)
+        referencias = self.extract_field(content, 'referencia')
         
         # Extraer modelos
-        modelos = self.extract_with_pattern(content, self.patterns['modelo'])
-        modelos = self.clean_extracted_data(modelos)
+        modelos = self.extract_field(content, 'modelo')
         
         # Detectar cadenas
-        es_cadena = bool(re.search(self.patterns['cadena'], content, re.IGNORECASE))
+        es_cadena = bool(self.patterns['cadena'].search(content))
         
         # Extraer pasos si es cadena
         pasos = []
         if es_cadena:
-            pasos = re.findall(self.patterns['paso'], content, re.IGNORECASE)
+            pasos = self.patterns['paso'].findall(content)
             pasos = [paso.strip() for paso in pasos if paso.strip()]
         
-        # Calcular totales
-        cantidad_total = sum(item['cantidad'] for item in productos_con_cantidad)
-        
         return {
             'numero_aceptacion': numero_aceptacion,
             'productos_con_cantidad': productos_con_cantidad,
@@ -322,25 +474,123 @@ class ImportacionAnalyzer:
         """
         self.logger.info("Iniciando procesamiento del archivo...")
         
-        content = self.load_file(file_path)
-        records = content.strip().split('\n')
-        records = [record.strip() for record in records if record.strip()]
+        self.data = []
+        self._detailed_df = None
+        self._summary_df = None
+        self._stats = None
+        try:
+            processed_records, total = self._process_records(self.iter_records(file_path))
+            self.logger.info(f"Archivo cargado exitosamente: {file_path}")
+        except UnicodeDecodeError:
+            # Si no está en UTF-8, cargar el archivo probando otras codificaciones y procesarlo de nuevo
+            content = self.load_file(file_path)
+            records = (record.strip() for record in content.split('\n'))
+            processed_records, total = self._process_records(record for record in records if record)
         
-        self.logger.info(f"Encontrados {len(records)} registros para procesar")
+        self.data = processed_records
+        self.logger.info(f"Encontrados {total} registros en el archivo")
+        self.logger.info(f"Procesamiento completado: {len(processed_records)} registros válidos")
+        return processed_records
+    
+    def _process_records(self, records: Iterator[str]) -> Tuple[List[Dict], int]:
+        """
+        Procesa los registros a medida que se leen, en bloques de TAMANO_BLOQUE_REGISTROS;
+        solo se mantienen en memoria los bloques pendientes, no el archivo completo.
+        
+        Args:
+            records (Iterator[str]): Registros no vacíos del archivo
+            
+        Returns:
+            Tuple[List[Dict], int]: Registros procesados y total de registros leídos
+        """
+        total = 0
+        
+        def bloques():
+            nonlocal total
+            bloque = []
+            for total, record in enumerate(records, 1):
+                # Los registros sin separador '|' no tienen contenido y se descartan
+                partes = record.split('|')
+                if len(partes) >= 2:
+                    bloque.append((total, partes))
+                    if len(bloque) == TAMANO_BLOQUE_REGISTROS:
+                        yield bloque
+                        bloque = []
+            if bloque:
+                yield bloque
         
         processed_records = []
-        for i, record in enumerate(records, 1):
+        pendientes = bloques()
+        primeros = list(islice(pendientes, 2))
+        if len(primeros) < 2:
+            # Un solo bloque no compensa arrancar procesos
+            for bloque in primeros:
+                processed_records.extend(self.process_block(bloque))
+            return processed_records, total
+        
+        # Los bloques son independientes y se reparten entre procesos; se envían a medida que
+        # se leen, con un máximo de dos por proceso en vuelo, y se recogen en orden
+        max_workers = os.cpu_count() or 1
+        en_vuelo = deque()
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            for bloque in chain(primeros, pendientes):
+                en_vuelo.append(executor.submit(self.process_block, bloque))
+                if len(en_vuelo) >= 2 * max_workers:
+                    processed_records.extend(en_vuelo.popleft().result())
+            while en_vuelo:
+                processed_records.extend(en_vuelo.popleft().result())
+        return processed_records, total
+    
+    def process_block(self, registros: List[Tuple[int, List[str]]]) -> List[Dict]:
+        """
+        Extrae la información de un bloque de registros.
+        
+        Args:
+            registros (List[Tuple[int, List[str]]]): Número de registro y partes separadas por '|'
+            
+        Returns:
+            List[Dict]: Lista de registros procesados del bloque
+        """
+        partes = dict(registros)
+        contents = pd.Series([parte[1] for parte in partes.values()], index=list(partes), dtype=object)
+        
+        # Extraer marcas, referencias, modelos y cadenas sobre la columna completa de contenidos
+        marcas = self.extract_field_column(contents, 'marca')
+        referencias = self.extract_field_column(contents, 'referencia')
+        modelos = self.extract_field_column(contents, 'modelo')
+        es_cadena = contents.str.contains(self.patterns['cadena'].pattern, flags=re.IGNORECASE, regex=True)
+        
+        processed_records = []
+        for i in contents.index:
             try:
-                data = self.extract_record_data(record)
-                if data:
-                    data['registro_numero'] = i
-                    processed_records.append(data)
-                    self.logger.debug(f"Registro {i} procesado exitosamente")
+                content = contents[i]
+                productos_con_cantidad, cantidad_total = self._extract_products_and_total(content)
+                
+                # Extraer pasos si es cadena
+                pasos = []
+                if es_cadena[i]:
+                    pasos = self.patterns['paso'].findall(content)
+                    pasos = [paso.strip() for paso in pasos if paso.strip()]
+                
+                data = {
+                    'numero_aceptacion': partes[i][0].strip(),
+                    'productos_con_cantidad': productos_con_cantidad,
+                    'marcas': marcas[i],
+                    'referencias': referencias[i],
+                    'modelos': modelos[i],
+                    'es_cadena': bool(es_cadena[i]),
+                    'pasos': pasos,
+                    'cantidad_total': cantidad_total,
+                    'total_productos': len(productos_con_cantidad),
+                    'total_marcas': len(marcas[i]),
+                    'total_referencias': len(referencias[i]),
+                    'registro_numero': i
+                }
+                processed_records.append(data)
+                self.logger.debug(f"Registro {i} procesado exitosamente")
             except Exception as e:
                 self.logger.warning(f"Error procesando registro {i}: {str(e)}")
         
-        self.data = processed_records
-        self.logger.info(f"Procesamiento completado: {len(processed_records)} registros válidos")
         return processed_records
     
     def create_detailed_dataframe(self) -> pd.DataFrame:
@@ -350,56 +600,60 @@ class ImportacionAnalyzer:
         Returns:
             pd.DataFrame: DataFrame con información detallada
         """
-        detailed_data = []
+        if self._detailed_df is not None:
+            return self._detailed_df
+        
+        # Columnas del DataFrame, llenadas por registro
+        columnas = {columna: [] for columna in [
+            'numero_aceptacion', 'registro_numero', 'cantidad', 'unidad', 'producto',
+            'marca', 'referencia', 'modelo', 'es_cadena', 'paso_medida',
+            'total_productos_registro', 'cantidad_total_registro', 'fecha_procesamiento'
+        ]}
+        
+        # Todas las filas comparten la misma fecha de procesamiento
+        fecha_procesamiento = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         
         for record in self.data:
-            numero_aceptacion = record['numero_aceptacion']
             productos_con_cantidad = record['productos_con_cantidad']
-            marcas = record['marcas']
-            referencias = record['referencias']
-            modelos = record['modelos']
-            es_cadena = record['es_cadena']
             pasos = record['pasos']
             
             # Crear una fila por producto con cantidad
             if productos_con_cantidad:
-                for i, item in enumerate(productos_con_cantidad):
-                    row = {
-                        'numero_aceptacion': numero_aceptacion,
-                        'registro_numero': record['registro_numero'],
-                        'cantidad': item['cantidad'],
-                        'unidad': item['unidad'],
-                        'producto': item['producto'],
-                        'marca': marcas[i] if i < len(marcas) else marcas[0] if marcas else 'NO ESPECIFICADA',
-                        'referencia': referencias[i] if i < len(referencias) else referencias[0] if referencias else 'NO ESPECIFICADA',
-                        'modelo': modelos[i] if i < len(modelos) else modelos[0] if modelos else 'NO ESPECIFICADO',
-                        'es_cadena': 'SÍ' if es_cadena else 'NO',
-                        'paso_medida': ', '.join(pasos) if pasos else 'N/A',
-                        'total_productos_registro': len(productos_con_cantidad),
-                        'cantidad_total_registro': record['cantidad_total'],
-                        'fecha_procesamiento': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                    }
-                    detailed_data.append(row)
+                n = len(productos_con_cantidad)
+                columnas['cantidad'].extend(item['cantidad'] for item in productos_con_cantidad)
+                columnas['unidad'].extend(item['unidad'] for item in productos_con_cantidad)
+                columnas['producto'].extend(item['producto'] for item in productos_con_cantidad)
+                columnas['total_productos_registro'].extend([n] * n)
+                columnas['cantidad_total_registro'].extend([record['cantidad_total']] * n)
             else:
                 # Si no hay productos específicos, crear una fila con información general
-                row = {
-                    'numero_aceptacion': numero_aceptacion,
-                    'registro_numero': record['registro_numero'],
-                    'cantidad': 0,
-                    'unidad': 'N/A',
-                    'producto': 'INFORMACIÓN NO ESPECÍFICA',
-                    'marca': marcas[0] if marcas else 'NO ESPECIFICADA',
-                    'referencia': referencias[0] if referencias else 'NO ESPECIFICADA',
-                    'modelo': modelos[0] if modelos else 'NO ESPECIFICADO',
-                    'es_cadena': 'SÍ' if es_cadena else 'NO',
-                    'paso_medida': ', '.join(pasos) if pasos else 'N/A',
-                    'total_productos_registro': 0,
-                    'cantidad_total_registro': 0,
-                    'fecha_procesamiento': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                }
-                detailed_data.append(row)
-        
-        return pd.DataFrame(detailed_data)
+                n = 1
+                columnas['cantidad'].append(0)
+                columnas['unidad'].append('N/A')
+                columnas['producto'].append('INFORMACIÓN NO ESPECÍFICA')
+                columnas['total_productos_registro'].append(0)
+                columnas['cantidad_total_registro'].append(0)
+            
+            columnas['numero_aceptacion'].extend([record['numero_aceptacion']] * n)
+            columnas['registro_numero'].extend([record['registro_numero']] * n)
+            columnas['marca'].extend(self._pad_values(record['marcas'], n, 'NO ESPECIFICADA'))
+            columnas['referencia'].extend(self._pad_values(record['referencias'], n, 'NO ESPECIFICADA'))
+            columnas['modelo'].extend(self._pad_values(record['modelos'], n, 'NO ESPECIFICADO'))
+            columnas['es_cadena'].extend(['SÍ' if record['es_cadena'] else 'NO'] * n)
+            columnas['paso_medida'].extend([', '.join(pasos) if pasos else 'N/A'] * n)
+            columnas['fecha_procesamiento'].extend([fecha_procesamiento] * n)
+        
+        self._detailed_df = pd.DataFrame(columnas)
+        return self._detailed_df
+    
+    @staticmethod
+    def _pad_values(valores: List[str], n: int, defecto: str) -> List[str]:
+        """
+        Devuelve n valores: los primeros n de la lista y, para las filas restantes, el
+        primer valor de la lista o el valor por defecto si está vacía.
+        """
+        relleno = valores[0] if valores else defecto
+        return valores[:n] + [relleno] * (n - len(valores[:n]))
     
     def create_summary_dataframe(self) -> pd.DataFrame:
         """
@@ -408,6 +662,9 @@ class ImportacionAnalyzer:
         Returns:
             pd.DataFrame: DataFrame resumen
         """
+        if self._summary_df is not None:
+            return self._summary_df
+        
         summary_data = []
         
         for record in self.data:
@@ -424,7 +681,8 @@ class ImportacionAnalyzer:
             }
             summary_data.append(row)
         
-        return pd.DataFrame(summary_data)
+        self._summary_df = pd.DataFrame(summary_data)
+        return self._summary_df
     
     def generate_statistics(self) -> Dict:
         """
@@ -433,24 +691,52 @@ class ImportacionAnalyzer:
         Returns:
             Dict: Diccionario con estadísticas
         """
-        df_detailed = self.create_detailed_dataframe()
+        if self._stats is not None:
+            return self._stats
+        
+        # Cantidades, marcas y cadenas de las filas detalladas, sin construir su DataFrame
+        cantidades = []
+        marcas = set()
+        productos_con_cadenas = 0
+        for record in self.data:
+            productos_con_cantidad = record['productos_con_cantidad']
+            filas = len(productos_con_cantidad) or 1
+            if productos_con_cantidad:
+                cantidades.extend(item['cantidad'] for item in productos_con_cantidad)
+            else:
+                cantidades.append(0)
+            marcas.update(self._pad_values(record['marcas'], filas, 'NO ESPECIFICADA'))
+            if record['es_cadena']:
+                productos_con_cadenas += filas
+        cantidades = pd.Series(cantidades)
+        
+        # Valores por registro en arreglos de NumPy para las reducciones
+        n = len(self.data)
+        total_productos = np.fromiter((record['total_productos'] for record in self.data), dtype=np.int64, count=n)
+        cantidad_total = np.fromiter((record['cantidad_total'] for record in self.data), dtype=np.float64, count=n)
+        es_cadena = np.fromiter((record['es_cadena'] for record in self.data), dtype=bool, count=n)
+        
+        # argmax devuelve el primer máximo, igual que max()
+        registro_mas_productos = self.data[total_productos.argmax()]
+        registro_mas_unidades = self.data[cantidad_total.argmax()]
         
         stats = {
-            'total_registros': len(self.data),
-            'total_productos': df_detailed.shape[0],
-            'total_unidades': df_detailed['cantidad'].sum(),
-            'productos_con_cadenas': len(df_detailed[df_detailed['es_cadena'] == 'SÍ']),
-            'marcas_unicas': df_detailed['marca'].nunique(),
-            'lista_marcas': sorted(df_detailed['marca'].unique().tolist()),
-            'registros_con_cadenas': sum(1 for record in self.data if record['es_cadena']),
-            'promedio_productos_por_registro': np.mean([record['total_productos'] for record in self.data]),
-            'promedio_unidades_por_producto': df_detailed['cantidad'].mean(),
-            'registro_con_mas_productos': max(self.data, key=lambda x: x['total_productos'])['numero_aceptacion'],
-            'registro_con_mas_unidades': max(self.data, key=lambda x: x['cantidad_total'])['numero_aceptacion'],
-            'max_productos_por_registro': max(record['total_productos'] for record in self.data),
-            'max_unidades_por_registro': max(record['cantidad_total'] for record in self.data)
+            'total_registros': n,
+            'total_productos': len(cantidades),
+            'total_unidades': cantidades.sum(),
+            'productos_con_cadenas': productos_con_cadenas,
+            'marcas_unicas': len(marcas),
+            'lista_marcas': sorted(marcas),
+            'registros_con_cadenas': int(np.count_nonzero(es_cadena)),
+            'promedio_productos_por_registro': total_productos.mean(),
+            'promedio_unidades_por_producto': cantidades.mean(),
+            'registro_con_mas_productos': registro_mas_productos['numero_aceptacion'],
+            'registro_con_mas_unidades': registro_mas_unidades['numero_aceptacion'],
+            'max_productos_por_registro': registro_mas_productos['total_productos'],
+            'max_unidades_por_registro': registro_mas_unidades['cantidad_total']
         }
         
+        self._stats = stats
         return stats
     
     def export_to_csv(self, output_path: str = "importaciones_detallado.csv") -> None:
@@ -471,7 +757,7 @@ class ImportacionAnalyzer:
         Args:
             output_path (str): Ruta del archivo de salida
         """
-        with pd.ExcelWriter(output_path, engine='openpyxl') as writer:
+        with pd.ExcelWriter(output_path, engine='xlsxwriter') as writer:
             # Hoja detallada
             df_detailed = self.create_detailed_dataframe()
             df_detailed.to_excel(writer, sheet_name='Detallado', index=False)
@@ -504,8 +790,13 @@ class ImportacionAnalyzer:
             'registros': self.data
         }
         
-        with open(output_path, 'w', encoding='utf-8') as f:
-            json.dump(report, f, ensure_ascii=False, indent=2)
+        if orjson is not None:
+            # orjson serializa en C, incluidos los escalares de NumPy de las estadísticas
+            with open(output_path, 'wb') as f:
+                f.write(orjson.dumps(report, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY))
+        else:
+            with open(output_path, 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
         
         self.logger.info(f"Reporte JSON exportado a: {output_path}")
     
@@ -551,17 +842,16 @@ def main():
     
     args = parser.parse_args()
     
-    # Verificar que el archivo existe
-    if not Path(args.file_path).exists():
-        print(f"Error: El archivo {args.file_path} no existe.")
-        return 1
-    
     try:
         # Crear analizador
         analyzer = ImportacionAnalyzer(log_level=args.log_level)
         
-        # Procesar archivo
-        analyzer.process_file(args.file_path)
+        # Procesar archivo; si no existe, la lectura lanza FileNotFoundError
+        try:
+            analyzer.process_file(args.file_path)
+        except FileNotFoundError:
+            print(f"Error: El archivo {args.file_path} no existe.")
+            return 1
         
         # Generar reportes
         analyzer.export_to_csv(args.output_csv)
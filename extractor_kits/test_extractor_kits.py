@@ -0,0 +1,58 @@
+import csv
+import os
+import tempfile
+import unittest
+
+import extractor_kits
+
+
+DIRECTORIO_MODULO = os.path.dirname(os.path.abspath(__file__))
+ARCHIVO_DICCIONARIO = os.path.join(DIRECTORIO_MODULO, 'diccionario_kits.json')
+ARCHIVO_EXPRESIONES = os.path.join(DIRECTORIO_MODULO, 'expresiones_regulares_kits.json')
+
+# Encabezado que escribe procesar_archivos_raw en dataraw.csv
+ENCABEZADO = 'numeroaceptacion|descripcion|cantidad|unidades\n'
+
+
+class ProcesarArchivoKitsTest(unittest.TestCase):
+    """
+    Separación de las líneas de dataraw.csv en procesar_archivo_kits.
+    """
+
+    def procesar(self, contenido):
+        """
+        Procesa el contenido como dataraw.csv y devuelve las filas del archivo de salida, sin
+        la que genera la propia línea de encabezado.
+        """
+        with tempfile.TemporaryDirectory() as directorio:
+            with open(os.path.join(directorio, 'dataraw.csv'), 'w', encoding='utf-8') as archivo:
+                archivo.write(contenido)
+            extractor_kits.procesar_archivo_kits(directorio, 'dataraw.csv', 'salida.csv',
+                                                 ARCHIVO_DICCIONARIO, ARCHIVO_EXPRESIONES)
+            with open(os.path.join(directorio, 'salida.csv'), encoding='utf-8', newline='') as archivo:
+                return [fila for fila in csv.DictReader(archivo, delimiter='|')
+                        if fila['numero_aceptacion'] != 'numeroaceptacion']
+
+    def test_descripcion_con_separador(self):
+        # La descripción conserva sus '|' y la cantidad original es la penúltima parte
+        filas = self.procesar(
+            ENCABEZADO +
+            '101|KIT PRODUCTO: CADENA 428H | MARCA: KTM | REFERENCIA: X1|3.0|U\n'
+        )
+        self.assertTrue(filas)
+        for fila in filas:
+            self.assertEqual(fila['numero_aceptacion'], '101')
+            self.assertEqual(fila['cantidad_original'], '3.0')
+        self.assertEqual({fila['marca'] for fila in filas}, {'KTM'})
+        self.assertEqual({fila['es_cadena'] for fila in filas}, {'SÍ'})
+
+    def test_lineas_con_menos_de_cuatro_partes(self):
+        filas = self.procesar(ENCABEZADO + '201|PRODUCTO: MANGO|4\n202|PRODUCTO: MANGO|5.0|U\n')
+        self.assertEqual({fila['numero_aceptacion'] for fila in filas}, {'202'})
+
+    def test_archivo_vacio(self):
+        self.assertEqual(self.procesar(''), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,21 +3,131 @@ import csv
 import json
 import pandas as pd
 import os
-
+from concurrent.futures import ThreadPoolExecutor
+from itertools import repeat
+
+
+# Reemplazos de símbolos y textos, en el orden en que se aplican. El orden importa:
+# un reemplazo puede crear o romper coincidencias de los siguientes
+# (". USO" -> ", USO" vuelve a coincidir con " USO", "_" -> ":" forma "UNIDADES:").
+# ";" y "/" van al final: pasados a "," antes podrían formar ", MARCA: SEGUN FACTURA"
+REEMPLAZOS_TEXTO = (
+    ("|", ":"),
+    ("_", ":"),
+    ("=", ":"),
+    ("(", " "),
+    (")", " "),
+    ("PAIS", ", PAIS"),
+    ("P. ORIGEN:", ", PAIS:"),
+    ("CANTIDAD DECLARADA: ", ", DECLARADA :"),
+    ("CANTIDAD FACTURADA:", ", CANTIDAD: "),
+    ("N O TIENE", "NO TIENE"),
+    ("NO TI ENE", "NO TIENE"),
+    ("NO TIEN E", "NO TIENE"),
+    ("NO TIE NE", "NO TIENE"),
+    (" WC", ", WC"),
+    ("REFERENCIA: ARANCELARIA", ", ARANCEL"),
+    ("REFERENCIA: ARANCELARI A", ", ARANCEL"),
+    ("PARTE NUMERO ", ""),
+    ("PA RTE NUMERO ", ""),
+    ("UNIDADES:", "UNIDADES."),
+    ("MARCA: IMPORTADOR:", ""),
+    ("MODELO", ", MODELO"),
+    ("ITEM", ", ITEM"),
+    (", MARCA: SEGUN FACTURA", ", MARCA: "),
+    ("SERIAL:", ", SERIAL:"),
+    ("YMARCA:", "Y, MARCA: "),
+    ("U6224", "QU6224"),
+    ("U 6224", "QU6224"),
+    ("SEGUN ORDEN DE COMPRA", ""),
+    (". USO", ", USO"),
+    (" USO", ", USO"),
+    (" BATERIA", ", BATERIA"),
+    (";", ","),
+    ("/", ","),
+)
+
+# Campos del archivo de salida, en el orden de los registros de procesar_linea_importacion
+CAMPOS_SALIDA = ['numero_aceptacion', 'referencia', 'marca', 'cantidad', 'cantidad_original']
+
+# Orden de aplicación de las expresiones regulares de normalización
+ORDEN_EXPRESIONES = [
+    "normalizar_cantidad_unidad_decimales",
+    "normalizar_cantidad_unidad_enteros",
+    "separar_cantidad_producto",
+    "normalizar_espacios_antes_producto",
+    "normalizar_cantidad_punto_coma",
+    "normalizar_cantidad_coma",
+    "eliminar_decimales",
+    "normalizar_punto_coma_mercancia",
+    "limpiar_espacios_multiples",
+    "patron_palabra_cantidad",
+    "normalizar_cantidad_espacio"
+]
+
+# Patrones de extracción, compilados una sola vez
+_PATRONES_REFERENCIA = [re.compile(patron, re.IGNORECASE) for patron in [
+    r',\s*REFERENCIA:\s*([^,]+?)(?=\s*,\s*(?:MARCA|CANTIDAD|REFERENCIA|PRODUCTO|MODELO|CODIGO|SERIAL|$))',
+    r'REFERENCIA:\s*([^,]+?)(?=\s*,\s*(?:MARCA|CANTIDAD|REFERENCIA|PRODUCTO|MODELO|CODIGO|SERIAL|$))',
+    r',\s*REFERENCIA:\s*([^,\.;:]+?)(?=\s*[,\.;:]|$)'
+]]
+
+_PATRONES_MARCA = [re.compile(patron, re.IGNORECASE) for patron in [
+    r',\s*MARCA:\s*([^,]+?)(?=\s*,\s*(?:MODELO|REFERENCIA|CANTIDAD|MARCA|PRODUCTO|CODIGO|SERIAL|$))',
+    r'MARCA:\s*([^,]+?)(?=\s*,\s*(?:MODELO|REFERENCIA|CANTIDAD|MARCA|PRODUCTO|CODIGO|SERIAL|$))',
+    r',\s*MARCA:\s*([^,\.;:]+?)(?=\s*[,\.;:]|$)'
+]]
+
+# Cantidad tras "CANTIDAD:", como número directo o entre paréntesis seguido de U (sin NIDAD).
+# Reúne los patrones anteriores: los de coma inicial y los de sufijo de unidad con número
+# directo solo encontraban números que "CANTIDAD:\s*(\d+)" ya encuentra
+_PATRON_CANTIDAD = re.compile(r'CANTIDAD:\s*(?:(\d+)|\((\d+)\)?\s*U(?!NIDAD))', re.IGNORECASE)
+
+# Etiquetas que deben aparecer en el texto para que los patrones de extracción coincidan
+_ETIQUETA_REFERENCIA = re.compile(r'REFERENCIA:', re.IGNORECASE)
+_ETIQUETA_MARCA = re.compile(r'MARCA:', re.IGNORECASE)
+
+# Espacios múltiples, guiones con espacios y signos sobrantes al final de una coincidencia
+_ESPACIOS = re.compile(r'\s+')
+_GUION = re.compile(r'\s*-\s*')
+_RECORTE_FINAL = re.compile(r'[,;\.:\s]+$')
+
+# Decimales en cero de una cantidad (12.00, 12,00)
+_DECIMALES_CERO = re.compile(r"(\d+)[.,]00\b")
+
+
+def _leer_excel_raw(file_path, columnas_usadas):
+    """
+    Lee la hoja DatosParte1 de un archivo Excel crudo, o devuelve None si no se puede leer.
+    """
+    try:
+        # Solo se leen las columnas que se usan para el CSV unificado
+        return pd.read_excel(file_path, sheet_name='DatosParte1', engine='calamine',
+                             usecols=lambda col: col in columnas_usadas)
+    except Exception as e:
+        print(f"Error reading {os.path.basename(file_path)}: {e}")
+        return None
 
 def procesar_archivos_raw(directorio_salida,archivo_entrada):
     excel_dir = 'dataraw'
     excel_dir = os.path.join(excel_dir, excel_dir)
-    excel_files = [f for f in os.listdir(excel_dir) if f.endswith('.xlsx') and not f.startswith('~$')]
+    excel_files = [entrada.name for entrada in os.scandir(excel_dir)
+                   if entrada.name.endswith('.xlsx') and not entrada.name.startswith('~$')]
 
-    dfs = {}
-    for file in excel_files:
-        file_path = os.path.join(excel_dir, file)
-        try:
-            df_excel = pd.read_excel(file_path, sheet_name='DatosParte1')
-            dfs[file] = df_excel
-        except Exception as e:
-            print(f"Error reading {file}: {e}")
+    detalle_cols = [
+        'Descripción de la Mercancía Detallada 1',
+        'Descripción de la Mercancía Detallada 2',
+        'Descripción de la Mercancía Detallada 3',
+        'Descripción de la Mercancía Detallada 4',
+        'Descripción de la Mercancía Detallada 5'
+    ]
+    columnas_usadas = set(detalle_cols + ['Número de Aceptación', 'Cantidad', 'Unidad Comercial'])
+
+    # Los archivos se leen en paralelo; map conserva el orden de excel_files
+    with ThreadPoolExecutor(max_workers=max(1, min(os.cpu_count() or 1, len(excel_files)))) as executor:
+        leidos = list(executor.map(_leer_excel_raw, [os.path.join(excel_dir, file) for file in excel_files],
+                                   repeat(columnas_usadas)))
+    dfs = {file: df_excel for file, df_excel in zip(excel_files, leidos) if df_excel is not None}
     
     print("Procesando Dataframes")
     if not dfs:
@@ -39,20 +149,13 @@ def procesar_archivos_raw(directorio_salida,archivo_entrada):
     #Remover "|" de los datos originales
     unified_df = unified_df.replace('|', '', regex=True)
 
-    detalle_cols = [
-        'Descripción de la Mercancía Detallada 1',
-        'Descripción de la Mercancía Detallada 2',
-        'Descripción de la Mercancía Detallada 3',
-        'Descripción de la Mercancía Detallada 4',
-        'Descripción de la Mercancía Detallada 5'
-    ]
-
     # Descargar columnas
     detalle_cols = [col for col in detalle_cols if col in unified_df.columns]
 
     print("\nNormalizando Descripciones de Mercancía")
-    # Concatenando espacios
-    unified_df['descripcion'] = unified_df[detalle_cols].fillna('').agg(' '.join, axis=1).str.strip()
+    # Concatenación por columnas en una sola llamada; las celdas numéricas se pasan a texto
+    detalle = unified_df[detalle_cols].fillna('').astype(str)
+    unified_df['descripcion'] = detalle.iloc[:, 0].str.cat(detalle.iloc[:, 1:], sep=' ').str.strip()
 
     # Creacion del nuevo Dataframe
     final_df = unified_df[['Número de Aceptación', 'descripcion', 'Cantidad', 'Unidad Comercial']].copy()
@@ -71,9 +174,14 @@ def procesar_archivos_raw(directorio_salida,archivo_entrada):
         os.makedirs(directory)
         
     output_file = os.path.join(directory, archivo_entrada)
-    final_df.to_csv(output_file, index=False, sep="|")
+    # El texto del CSV se devuelve para que procesar_archivo_importacion no tenga que releerlo
+    contenido = final_df.to_csv(index=False, sep="|")
+    with open(output_file, 'w', encoding='utf-8', newline='') as archivo:
+        archivo.write(contenido)
     print(f"\nDataframe generado en archivo: {output_file}")
 
+    return contenido
+
 
 def cargar_diccionario(archivo_diccionario):
     """
@@ -111,90 +219,143 @@ def cargar_expresiones_regulares(archivo_expresiones):
         print(f"Error al cargar las expresiones regulares: {e}")
         return {}
 
-def aplicar_expresiones_regulares_ordenadas(texto, expresiones_regulares):
-    """
-    Aplica todas las expresiones regulares de normalización al texto en orden específico.
-    """
-    orden_aplicacion = [
-        "normalizar_cantidad_unidad_decimales",
-        "normalizar_cantidad_unidad_enteros", 
-        "separar_cantidad_producto",
-        "normalizar_espacios_antes_producto",
-        "normalizar_cantidad_punto_coma",
-        "normalizar_cantidad_coma",
-        "eliminar_decimales",
-        "normalizar_punto_coma_mercancia",
-        "limpiar_espacios_multiples",
-        "patron_palabra_cantidad",
-        "normalizar_cantidad_espacio"
-    ]
-    
-    for nombre_expr in orden_aplicacion:
+def compilar_expresiones_ordenadas(expresiones_regulares):
+    """
+    Compila las expresiones regulares de normalización en el orden de aplicación.
+    """
+    compiladas = []
+    for nombre_expr in ORDEN_EXPRESIONES:
         if nombre_expr in expresiones_regulares:
             config = expresiones_regulares[nombre_expr]
             patron = config.get("patron", "")
             reemplazo = config.get("reemplazo", "")
             if patron:
                 try:
-                    texto = re.sub(patron, reemplazo, texto)
+                    compiladas.append((re.compile(patron), reemplazo))
                 except re.error:
                     continue
     
-    return texto.strip()
-
-def limpiar_y_normalizar_texto(texto, expresiones_regulares):
-    """
-    Aplica las transformaciones completas de limpieza y normalización al texto.
-    """
-    # Reemplazar símbolos por caracteres estándar
-    texto = texto.replace("|", ":")
-    texto = texto.replace("_", ":")
-    texto = texto.replace("=", ":")
-    texto = texto.replace("(", " ")
-    texto = texto.replace(")", " ")
-    texto = texto.replace("PAIS", ", PAIS")
-    texto = texto.replace("P. ORIGEN:", ", PAIS:")
-    texto = texto.replace("CANTIDAD DECLARADA: ", ", DECLARADA :")
-    texto = texto.replace("CANTIDAD FACTURADA:", ", CANTIDAD: ")
-    texto = texto.replace("N O TIENE", "NO TIENE")
-    texto = texto.replace("NO TI ENE", "NO TIENE")
-    texto = texto.replace("NO TIEN E", "NO TIENE")
-    texto = texto.replace("NO TIE NE", "NO TIENE")
-    texto = texto.replace(" WC",", WC")
-    texto = texto.replace("REFERENCIA: ARANCELARIA",", ARANCEL")
-    texto = texto.replace("REFERENCIA: ARANCELARI A",", ARANCEL")
-    texto = texto.replace("PARTE NUMERO ", "")
-    texto = texto.replace("PA RTE NUMERO ", "")
-    texto = texto.replace("UNIDADES:", "UNIDADES.")
-    texto = texto.replace("MARCA: IMPORTADOR:", "")
-    texto = texto.replace("MODELO",", MODELO")
-    texto = texto.replace("ITEM",", ITEM")
-    texto = texto.replace(", MARCA: SEGUN FACTURA", ", MARCA: ")
-    texto = texto.replace("SERIAL:", ", SERIAL:")
-    texto = texto.replace("YMARCA:", "Y, MARCA: ")
-    texto = texto.replace("U6224", "QU6224")
-    texto = texto.replace("U 6224", "QU6224")
-    texto = texto.replace("SEGUN ORDEN DE COMPRA", "")
-    texto = texto.replace(". USO", ", USO")
-    texto = texto.replace(" USO", ", USO")
-    texto = texto.replace(" BATERIA", ", BATERIA")
-    texto = texto.replace(";", ",")
-    texto = texto.replace("/", ",")
+    return compiladas
+
+def aplicar_expresiones_regulares_ordenadas(textos, expresiones_compiladas):
+    """
+    Aplica todas las expresiones regulares de normalización, ya compiladas en orden de
+    aplicación, a la columna de textos.
+    """
+    for patron, reemplazo in expresiones_compiladas:
+        try:
+            textos = textos.str.replace(patron, reemplazo, regex=True)
+        except re.error:
+            continue
     
+    return textos.str.strip()
+
+def limpiar_y_normalizar_texto(textos, expresiones_compiladas):
+    """
+    Aplica las transformaciones completas de limpieza y normalización a la columna completa de textos.
+    """
+    # Reemplazar símbolos y textos por los estándar, en orden. Desde pandas 3 (requirements.txt
+    # exige pandas>=3), con pyarrow instalado, el tipo str guarda la columna en Arrow y cada
+    # reemplazo literal es un kernel sobre todo el buffer; luego se vuelve a object para que
+    # re y str.upper sean los de Python
+    textos = textos.astype(str)
+    for original, reemplazo in REEMPLAZOS_TEXTO:
+        textos = textos.str.replace(original, reemplazo, regex=False)
+    textos = textos.astype(object)
      
     # Aplicar expresiones regulares de normalización
-    texto = aplicar_expresiones_regulares_ordenadas(texto, expresiones_regulares)
+    textos = aplicar_expresiones_regulares_ordenadas(textos, expresiones_compiladas)
     # Convertir a mayúsculas
-    texto = texto.upper()
+    textos = textos.str.upper()
     
     # Normalizar espacios múltiples
-    texto = re.sub(r'\s+', ' ', texto).strip()
+    textos = textos.str.replace(_ESPACIOS, ' ', regex=True).str.strip()
     
-    return texto
+    return textos
+
+def _se_solapan(a, b):
+    """
+    Indica si dos cadenas pueden compartir caracteres cuando aparecen en un mismo texto.
+    """
+    if a in b or b in a:
+        return True
+    return any(a.endswith(b[:k]) or b.endswith(a[:k]) for k in range(1, min(len(a), len(b))))
 
-def aplicar_reemplazos_diccionario(texto, diccionario):
+def _agrupar_variantes(variantes, reemplazo):
     """
-    Aplica los reemplazos de palabras clave según el diccionario.
+    Divide las variantes en grupos que se pueden reemplazar en una sola pasada con el mismo
+    resultado que los reemplazos secuenciales: dentro de un grupo ninguna variante se solapa
+    con otra ni con el texto de reemplazo. Las variantes que sí se solapan quedan solas.
+    """
+    grupos = []
+    for variante in variantes:
+        encadenada = _se_solapan(variante, reemplazo)
+        if (grupos and not encadenada and not _se_solapan(grupos[-1][0], reemplazo)
+                and not any(_se_solapan(variante, otra) for otra in grupos[-1])):
+            grupos[-1].append(variante)
+        else:
+            grupos.append([variante])
+    return grupos
+
+def _reemplazar_variantes(textos, corpus, variantes, reemplazo):
+    """
+    Reemplaza todas las variantes de una categoría con una pasada por grupo de variantes.
+    Los grupos cuyas variantes no aparecen en el corpus (los textos unidos) se omiten.
+    Devuelve los textos y el corpus actualizados.
+    """
+    for grupo in _agrupar_variantes(variantes, reemplazo):
+        grupo = [variante for variante in grupo if variante in corpus]
+        if not grupo:
+            continue
+        if len(grupo) == 1:
+            textos = textos.str.replace(grupo[0], reemplazo, regex=False)
+        else:
+            patron = re.compile('|'.join(re.escape(variante) for variante in grupo))
+            textos = textos.str.replace(patron, reemplazo.replace('\\', r'\\'), regex=True)
+        corpus = '\n'.join(textos)
+    return textos, corpus
+
+def _agrupar_mapa(mapa):
+    """
+    Divide los pares variante -> reemplazo con reemplazo no vacío en grupos que se pueden
+    aplicar en una sola pasada con el mismo resultado que los reemplazos secuenciales: dentro
+    de un grupo ninguna variante se solapa con otra ni con el reemplazo de otra.
+    """
+    grupos = []
+    for variant, reemplazo in mapa.items():
+        if not reemplazo:
+            continue
+        if grupos and not any(
+            _se_solapan(variant, otra) or _se_solapan(variant, otro_reemplazo) or _se_solapan(otra, reemplazo)
+            for otra, otro_reemplazo in grupos[-1]
+        ):
+            grupos[-1].append((variant, reemplazo))
+        else:
+            grupos.append([(variant, reemplazo)])
+    return grupos
+
+def _reemplazar_mapa(textos, corpus, mapa):
+    """
+    Aplica en orden los reemplazos de un diccionario variante -> reemplazo, con una pasada por
+    grupo de variantes y omitiendo las que no aparecen en el corpus. Devuelve los textos y el
+    corpus actualizados.
+    """
+    for grupo in _agrupar_mapa(mapa):
+        grupo = [(variant, reemplazo) for variant, reemplazo in grupo if variant in corpus]
+        if not grupo:
+            continue
+        if len(grupo) == 1:
+            textos = textos.str.replace(grupo[0][0], grupo[0][1], regex=False)
+        else:
+            reemplazos = dict(grupo)
+            patron = re.compile('|'.join(re.escape(variant) for variant in reemplazos))
+            textos = textos.str.replace(patron, lambda coincidencia: reemplazos[coincidencia.group(0)], regex=True)
+        corpus = '\n'.join(textos)
+    return textos, corpus
+
+def aplicar_reemplazos_diccionario(textos, diccionario):
+    """
+    Aplica los reemplazos de palabras clave según el diccionario sobre la columna de textos.
     """
     # Extraer variantes del diccionario
     segun_variants = diccionario.get("segun_variants", [])
@@ -204,90 +365,82 @@ def aplicar_reemplazos_diccionario(texto, diccionario):
     cantidad_variants = diccionario.get("cantidad_variants", [])
     codigo_variants = diccionario.get("codigo_variants", [])
     producto_variants = diccionario.get("producto_variants", [])
-    marcas_conocidas = diccionario.get("marcas_conocidas", [])
-    
-    # Aplicar reemplazos
-    for variant in segun_variants:
-        if variant in texto:
-            texto = texto.replace(variant, " SEGUN ")
-    
-    for variant in factura_variants:
-        if variant in texto:
-            texto = texto.replace(variant, " FACTURA ")
-    
-    for variant in referencia_variants:
-        if variant in texto:
-            texto = texto.replace(variant, ", REFERENCIA: ")
-    
-    for variant in marca_variants:
-        if variant in texto:
-            texto = texto.replace(variant, ", MARCA: ")
-    
-    for variant in cantidad_variants:
-       if variant in texto:
-            texto = texto.replace(variant, ", CANTIDAD: ")
+    marcas_conocidas = diccionario.get("marcas_conocidas", {})
+    referencia_modelo_variants = diccionario.get("referencia_modelo_variants", {})
     
-    for variant in codigo_variants:
-        if variant in texto:
-            texto = texto.replace(variant, ", CODIGO: ")
+    # Textos de la columna unidos, para saber qué variantes aparecen sin recorrer cada texto
+    corpus = '\n'.join(textos)
     
-    for variant in producto_variants:
-        if variant in texto:
-            texto = texto.replace(variant, ", PRODUCTO: ")
+    # Aplicar reemplazos
+    textos, corpus = _reemplazar_variantes(textos, corpus, segun_variants, " SEGUN ")
+    textos, corpus = _reemplazar_variantes(textos, corpus, factura_variants, " FACTURA ")
+    textos, corpus = _reemplazar_variantes(textos, corpus, referencia_variants, ", REFERENCIA: ")
+    textos, corpus = _reemplazar_variantes(textos, corpus, marca_variants, ", MARCA: ")
+    textos, corpus = _reemplazar_variantes(textos, corpus, cantidad_variants, ", CANTIDAD: ")
+    textos, corpus = _reemplazar_variantes(textos, corpus, codigo_variants, ", CODIGO: ")
+    textos, corpus = _reemplazar_variantes(textos, corpus, producto_variants, ", PRODUCTO: ")
     
 
     #Reemplazar diccionario de marcas conocidas
-    for variant in marcas_conocidas:
-        if variant in texto:
-            # reemplazar variante por el valor de reemplazo del diccionario
-            reemplazo = diccionario.get("marcas_conocidas", {}).get(variant, "")
-            if reemplazo:
-                texto = texto.replace(variant, reemplazo)   
+    textos, corpus = _reemplazar_mapa(textos, corpus, marcas_conocidas)
     
     # Reemplazar diccionario de referencias modelo
-    for variant in diccionario.get("referencia_modelo_variants", {}):
-        if variant in texto:
-            # reemplazar variante por el valor de reemplazo del diccionario
-            reemplazo = diccionario.get("referencia_modelo_variants", {}).get(variant, "")
-            if reemplazo:
-                texto = texto.replace(variant, reemplazo)
+    textos, corpus = _reemplazar_mapa(textos, corpus, referencia_modelo_variants)
 
-    return texto
+    return textos
 
-def aplicar_correcciones_referencia(referencia, diccionario):
+def preparar_correcciones_referencia(diccionario):
     """
-    Aplica correcciones específicas a las referencias usando el diccionario.
+    Indexa las correcciones de referencia del diccionario por la variante en mayúsculas y sin
+    espacios en los extremos; si dos variantes coinciden se conserva la primera.
     """
-    referencia_modelo_variants = diccionario.get("referencia_modelo_variants", {})
-    
-    for variante_incorrecta, referencia_correcta in referencia_modelo_variants.items():
-        if referencia.upper().strip() == variante_incorrecta.upper().strip():
-            return referencia_correcta
+    correcciones = {}
+    for variante_incorrecta, referencia_correcta in diccionario.get("referencia_modelo_variants", {}).items():
+        correcciones.setdefault(variante_incorrecta.upper().strip(), referencia_correcta)
+    return correcciones
+
+def aplicar_correcciones_referencia(referencia, correcciones):
+    """
+    Aplica correcciones específicas a las referencias usando las correcciones indexadas.
+    """
+    clave = referencia.upper().strip()
+    if clave in correcciones:
+        return correcciones[clave]
     
-    referencia_normalizada = re.sub(r'\s*-\s*', '-', referencia)
-    referencia_normalizada = re.sub(r'\s+', ' ', referencia_normalizada).strip()
+    referencia_normalizada = _GUION.sub('-', referencia)
+    referencia_normalizada = _ESPACIOS.sub(' ', referencia_normalizada).strip()
     
     return referencia_normalizada
 
-def extraer_referencias(texto_procesado, diccionario):
+def _inicio_etiqueta(texto_procesado, etiqueta):
+    """
+    Posición desde la que puede coincidir un patrón de la etiqueta (incluida la coma y los
+    espacios previos), o None si la etiqueta no aparece en el texto.
+    """
+    coincidencia = etiqueta.search(texto_procesado)
+    if coincidencia is None:
+        return None
+    previo = texto_procesado[:coincidencia.start()].rstrip()
+    if previo.endswith(','):
+        return len(previo) - 1
+    return coincidencia.start()
+
+def extraer_referencias(texto_procesado, correcciones):
     """
     Extrae todas las referencias del texto procesado.
     """
     referencias = set()
+    inicio = _inicio_etiqueta(texto_procesado, _ETIQUETA_REFERENCIA)
+    if inicio is None:
+        return ['NO TIENE']
     
-    patrones_referencia = [
-        r',\s*REFERENCIA:\s*([^,]+?)(?=\s*,\s*(?:MARCA|CANTIDAD|REFERENCIA|PRODUCTO|MODELO|CODIGO|SERIAL|$))',
-        r'REFERENCIA:\s*([^,]+?)(?=\s*,\s*(?:MARCA|CANTIDAD|REFERENCIA|PRODUCTO|MODELO|CODIGO|SERIAL|$))',
-        r',\s*REFERENCIA:\s*([^,\.;:]+?)(?=\s*[,\.;:]|$)'
-    ]
-    
-    for patron in patrones_referencia:
-        matches = re.findall(patron, texto_procesado, re.IGNORECASE)
+    for patron in _PATRONES_REFERENCIA:
+        matches = patron.findall(texto_procesado, inicio)
         for match in matches:
             referencia = match.strip()
-            referencia = re.sub(r'[,;\.:\s]+$', '', referencia)
+            referencia = _RECORTE_FINAL.sub('', referencia)
             if referencia and len(referencia) > 1 and referencia.upper() not in ['NO TIENE', 'SEGUN FACTURA']:
-                referencia_corregida = aplicar_correcciones_referencia(referencia, diccionario)
+                referencia_corregida = aplicar_correcciones_referencia(referencia, correcciones)
                 referencias.add(referencia_corregida)
     
     return list(referencias) if referencias else ['NO TIENE']
@@ -297,18 +450,15 @@ def extraer_marcas(texto_procesado):
     Extrae todas las marcas del texto procesado.
     """
     marcas = set()
+    inicio = _inicio_etiqueta(texto_procesado, _ETIQUETA_MARCA)
+    if inicio is None:
+        return ['NO TIENE']
     
-    patrones_marca = [
-        r',\s*MARCA:\s*([^,]+?)(?=\s*,\s*(?:MODELO|REFERENCIA|CANTIDAD|MARCA|PRODUCTO|CODIGO|SERIAL|$))',
-        r'MARCA:\s*([^,]+?)(?=\s*,\s*(?:MODELO|REFERENCIA|CANTIDAD|MARCA|PRODUCTO|CODIGO|SERIAL|$))',
-        r',\s*MARCA:\s*([^,\.;:]+?)(?=\s*[,\.;:]|$)'
-    ]
-    
-    for patron in patrones_marca:
-        matches = re.findall(patron, texto_procesado, re.IGNORECASE)
+    for patron in _PATRONES_MARCA:
+        matches = patron.findall(texto_procesado, inicio)
         for match in matches:
             marca = match.strip()
-            marca = re.sub(r'[,;\.:\s]+$', '', marca)
+            marca = _RECORTE_FINAL.sub('', marca)
             if marca and len(marca) > 1 and marca.upper() != 'NO TIENE':
                 marcas.add(marca)
 
@@ -320,48 +470,44 @@ def extraer_cantidades(texto_procesado):
     """
     cantidades = set()
     
-    patrones_cantidad = [
-        r',\s*CANTIDAD:\s*(\d+)\s*UNIDADES?',
-        r',\s*CANTIDAD:\s*(\d+)\s*U(?!NIDAD)',
-        r',\s*CANTIDAD:\s*\(?(\d+)\)?\s*U(?!NIDAD)',
-        r',\s*CANTIDAD:\s*(\d+)',
-        r'CANTIDAD:\s*(\d+)\s*UNIDADES?',
-        r'CANTIDAD:\s*(\d+)\s*U(?!NIDAD)',
-        r'CANTIDAD:\s*\(?(\d+)\)?\s*U(?!NIDAD)',
-        r'CANTIDAD:\s*(\d+)'
-    ]
-    
-    for patron in patrones_cantidad:
-        matches = re.findall(patron, texto_procesado, re.IGNORECASE)
-        for match in matches:
-            try:
-                cantidad = int(match)
-                if cantidad > 0:
-                    cantidades.add(cantidad)
-            except ValueError:
-                continue
+    for numero, numero_parentesis in _PATRON_CANTIDAD.findall(texto_procesado):
+        cantidad = int(numero or numero_parentesis)
+        if cantidad > 0:
+            cantidades.add(cantidad)
     
     return sorted(list(cantidades)) if cantidades else 0
 
-def procesar_linea_importacion(descripcion, numero_aceptacion, cantidad_original, expresiones_regulares, diccionario):
+def _rellenar(valores, n, defecto):
     """
-    Procesa una línea completa del archivo de importación.
+    Completa la lista hasta n elementos repitiendo el último, o con el valor por defecto si está vacía.
+    """
+    if not valores:
+        return [defecto] * n
+    return valores + [valores[-1]] * (n - len(valores))
+
+def procesar_linea_importacion(texto_procesado, numero_aceptacion, cantidad_original, correcciones, extraidos=None):
+    """
+    Procesa una línea completa del archivo de importación a partir de su descripción ya limpia,
+    normalizada y con los reemplazos del diccionario aplicados. Si se recibe extraidos, los datos
+    de cada texto se guardan ahí y se reutilizan cuando el texto se repite.
+    Cada registro es una tupla con los valores de CAMPOS_SALIDA.
     """
-    # Limpiar y normalizar el texto
-    texto_limpio = limpiar_y_normalizar_texto(descripcion, expresiones_regulares)
-    
-    # Aplicar reemplazos del diccionario
-    texto_procesado = aplicar_reemplazos_diccionario(texto_limpio, diccionario)
-    
     # Extraer datos estructurados
-    referencias = extraer_referencias(texto_procesado, diccionario)
-    marcas = extraer_marcas(texto_procesado)
-    cantidades = extraer_cantidades(texto_procesado)
+    datos = extraidos.get(texto_procesado) if extraidos is not None else None
+    if datos is None:
+        datos = (
+            extraer_referencias(texto_procesado, correcciones),
+            extraer_marcas(texto_procesado),
+            extraer_cantidades(texto_procesado)
+        )
+        if extraidos is not None:
+            extraidos[texto_procesado] = datos
+    referencias, marcas, cantidades = datos
 
     
     # Procesar cantidad original
     try:
-        cantidad_limpia = re.sub(r"(\d+)[.,]00\b", r"\1", str(cantidades))
+        cantidad_limpia = _DECIMALES_CERO.sub(r"\1", str(cantidades))
         cantidad_original_int = int(float(cantidad_limpia))
     except (ValueError, TypeError):
         cantidad_original_int = 0
@@ -370,31 +516,28 @@ def procesar_linea_importacion(descripcion, numero_aceptacion, cantidad_original
     if not cantidades and cantidades == 0:
         cantidades = [cantidad_original]
     
-    # Crear registros únicos
+    # Crear registros únicos; el número de aceptación y la cantidad original son comunes a la
+    # línea, así que basta comparar referencia, marca y cantidad
     registros = []
+    vistos = set()
     max_elementos = max(len(referencias), len(marcas), len(cantidades), 1)
     
-    for i in range(max_elementos):
-        referencia = referencias[min(i, len(referencias)-1)] if referencias else 'NO TIENE'
-        marca = marcas[min(i, len(marcas)-1)] if marcas else 'NO TIENE'
-        cantidad = cantidades[min(i, len(cantidades)-1)] if cantidades else cantidad_original_int
-        
-        registro = {
-            'numero_aceptacion': numero_aceptacion,
-            'referencia': referencia,
-            'marca': marca,
-            'cantidad': cantidad,
-            'cantidad_original': cantidad_original
-        }
-        
-        if registro not in registros:
-            registros.append(registro)
+    for referencia, marca, cantidad in zip(
+        _rellenar(referencias, max_elementos, 'NO TIENE'),
+        _rellenar(marcas, max_elementos, 'NO TIENE'),
+        _rellenar(cantidades, max_elementos, cantidad_original_int)
+    ):
+        clave = (referencia, marca, cantidad)
+        if clave not in vistos:
+            vistos.add(clave)
+            registros.append((numero_aceptacion, referencia, marca, cantidad, cantidad_original))
     
     return registros
 
-def procesar_archivo_importacion(directorio_salida,archivo_entrada, archivo_salida, archivo_diccionario="diccionario.json", archivo_expresiones="expresiones_regulares.json"):
+def procesar_archivo_importacion(directorio_salida,archivo_entrada, archivo_salida, archivo_diccionario="diccionario.json", archivo_expresiones="expresiones_regulares.json", texto_entrada=None):
     """
     Función principal que procesa el archivo de importación completo.
+    Si se recibe texto_entrada (el CSV generado por procesar_archivos_raw) no se vuelve a leer el archivo.
     """
     # Cargar configuraciones
     diccionario = cargar_diccionario(archivo_diccionario)
@@ -402,9 +545,9 @@ def procesar_archivo_importacion(directorio_salida,archivo_entrada, archivo_sali
         return
     
     expresiones_regulares = cargar_expresiones_regulares(archivo_expresiones)
+    expresiones_compiladas = compilar_expresiones_ordenadas(expresiones_regulares)
     
     # Procesar archivo línea por línea
-    resultados = []
     lineas_procesadas = 0
     lineas_con_error = 0
 
@@ -414,71 +557,83 @@ def procesar_archivo_importacion(directorio_salida,archivo_entrada, archivo_sali
     if not os.path.exists(directorio_salida):
         os.makedirs(directorio_salida)
     
+    # Leer las líneas del archivo como una columna de texto. No se usa read_csv porque cada
+    # línea física es un registro: la descripción puede contener '|' y comillas sin escapar
+    if texto_entrada is not None:
+        # Mismos saltos de línea que se obtendrían al leer el archivo en modo texto
+        contenido = texto_entrada.replace('\r\n', '\n').replace('\r', '\n')
+    else:
+        try:
+            with open(archivo_entrada, 'r', encoding='utf-8') as archivo:
+                contenido = archivo.read()
+        
+        except FileNotFoundError:
+            print(f"Error: No se pudo encontrar el archivo {archivo_entrada}")
+            return
+        except Exception as e:
+            print(f"Error al leer el archivo: {e}")
+            return
+
+    lineas = pd.Series(contenido.split('\n'), dtype=object).str.strip()
+
+    # Separar los campos de las líneas con al menos 4 partes: el número de aceptación es la
+    # primera, la cantidad la penúltima y la descripción todo lo que queda entre ellas
+    lineas = lineas[lineas != '']
+    validas = lineas.str.count(r'\|') >= 3
+    lineas_con_error += int((~validas).sum())
+
+    campos = lineas[validas].str.rsplit('|', n=2)
+    inicio = campos.str[0].str.split('|', n=1)
+    numeros_aceptacion = inicio.str[0].str.strip().tolist()
+    descripciones = inicio.str[1].str.strip()
+    cantidades_originales = campos.str[1].str.strip().tolist()
+
+    # Limpiar y normalizar todas las descripciones sobre la columna completa; con tipo object
+    # los métodos .str usan los de str de Python (mayúsculas, espacios) igual que por línea
+    textos_limpios = limpiar_y_normalizar_texto(descripciones, expresiones_compiladas)
+    textos_procesados = aplicar_reemplazos_diccionario(textos_limpios, diccionario)
+    correcciones = preparar_correcciones_referencia(diccionario)
+    # Las descripciones se repiten entre líneas; los datos extraídos se guardan por texto, solo
+    # para los textos que se repiten y hasta su última aparición, para no retener el archivo
+    extraidos = {}
+    repetidos = textos_procesados.duplicated(keep=False).tolist()
+    ultimos = (~textos_procesados.duplicated(keep='last')).tolist()
+
+    # Escribir archivo de salida a medida que se procesa cada línea; solo se guardan las
+    # claves de los registros ya escritos para eliminar duplicados
+    registros_vistos = set()
     try:
-        with open(archivo_entrada, 'r', encoding='utf-8') as archivo:
-            for numero_linea, linea in enumerate(archivo, 1):
-                linea = linea.strip()
-                if not linea:
-                    continue
-                
+        with open(archivo_salida, 'w', newline='', encoding='utf-8') as csvfile:
+            writer = csv.writer(csvfile)
+            
+            writer.writerow(CAMPOS_SALIDA)
+            for numero_aceptacion, texto_procesado, cantidad_original, repetido, ultimo in zip(
+                    numeros_aceptacion, textos_procesados, cantidades_originales, repetidos, ultimos):
                 try:
-                    partes = linea.split('|')
-                    if len(partes) >= 4:
-                        numero_aceptacion = partes[0].strip()
-                        descripcion = '|'.join(partes[1:-2]).strip()
-                        cantidad_original = partes[-2].strip()
-                        # unidades = partes[-1].strip()
-                        
-                        registros_linea = procesar_linea_importacion(
-                            descripcion, numero_aceptacion, cantidad_original, 
-                            expresiones_regulares, diccionario
-                        )
-                        
-                        resultados.extend(registros_linea)    
-                        lineas_procesadas += 1
-                        
-                    else:
-                        lineas_con_error += 1
-                        
+                    registros_linea = procesar_linea_importacion(
+                        texto_procesado, numero_aceptacion, cantidad_original, correcciones,
+                        extraidos if repetido else None
+                    )
+                    lineas_procesadas += 1
+                    
                 except Exception as e:
                     lineas_con_error += 1
                     continue
-    
-    except FileNotFoundError:
-        print(f"Error: No se pudo encontrar el archivo {archivo_entrada}")
-        return
-    except Exception as e:
-        print(f"Error al leer el archivo: {e}")
-        return
-
-    # Eliminar duplicados finales
-    registros_unicos = []
-    registros_vistos = set()
-    
-    for registro in resultados:
-        clave_unica = (
-            registro['numero_aceptacion'],
-            registro['referencia'],
-            registro['marca'],
-            registro['cantidad']
-        )
-        
-        if clave_unica not in registros_vistos:
-            registros_vistos.add(clave_unica)
-            registros_unicos.append(registro)
-
-    # Escribir archivo de salida
-    try:
-        with open(archivo_salida, 'w', newline='', encoding='utf-8') as csvfile:
-            fieldnames = ['numero_aceptacion', 'referencia', 'marca', 'cantidad', 'cantidad_original']
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            
-            writer.writeheader()
-            for resultado in registros_unicos:
-                writer.writerow(resultado)
+                finally:
+                    if ultimo:
+                        extraidos.pop(texto_procesado, None)
+
+                # La clave única son todos los campos menos la cantidad original
+                nuevos = []
+                for registro in registros_linea:
+                    clave_unica = registro[:4]
+                    if clave_unica not in registros_vistos:
+                        registros_vistos.add(clave_unica)
+                        nuevos.append(registro)
+                writer.writerows(nuevos)
         
         # Mostrar únicamente resultado final
-        print(f"Procesamiento completado: {lineas_procesadas} líneas procesadas, {len(registros_unicos)} registros únicos generados")
+        print(f"Procesamiento completado: {lineas_procesadas} líneas procesadas, {len(registros_vistos)} registros únicos generados")
         print(f"Archivo de salida: {archivo_salida}")
         
     except Exception as e:
@@ -492,7 +647,7 @@ if __name__ == "__main__":
     archivo_expresiones = "expresiones_regulares.json"
     
     print(f"Inicio de proceso de archivos de Excel")
-    procesar_archivos_raw(directorio_salida,archivo_entrada)
+    texto_raw = procesar_archivos_raw(directorio_salida,archivo_entrada)
 
     print(f"Inicio de proceso de archivo de Baterias")
-    procesar_archivo_importacion(directorio_salida,archivo_entrada, archivo_salida, archivo_diccionario, archivo_expresiones)
\ No newline at end of file
+    procesar_archivo_importacion(directorio_salida,archivo_entrada, archivo_salida, archivo_diccionario, archivo_expresiones, texto_entrada=texto_raw)
\ No newline at end of file